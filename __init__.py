@@ -1,11 +1,20 @@
 from .tokenizer import Token
 from .tokenizer import TokenCategory
+from .tokenizer import TokenArray
+from .tokenizer import TokenView
 
 from .tokenizer import unicode_tokenize
+from .tokenizer import unicode_tokenize_spans
 from .tokenizer import word_n_grams
+from .tokenizer import text_n_gram_hashes
+from .tokenizer import word_n_gram_hashes
 
 from .tokenizer import sentence_split
 from .tokenizer import sentence_split_tokens
+from .tokenizer import sentence_split_spans
+
+from .tokenizer import unicode_tokenize_stream
+from .tokenizer import sentence_split_stream
 
 from .tokenizer import is_text_char
 from .tokenizer import is_space_char
@@ -0,0 +1,24 @@
+from typing import Any
+from typing import Generator
+from typing import Iterable
+from typing import List
+from typing import Optional
+
+
+def batches(texts: Iterable[str], chunksize: Optional[int], batch_chars: int) -> Generator[List[str], Any, None]:
+    """
+    group texts into batches of `chunksize` texts, or if chunksize is None, into batches of about batch_chars chars
+    so that many short texts don't each pay for a round trip to a worker process, and long texts don't end up stuck
+    in one worker
+    """
+    batch = []
+    n_chars = 0
+    for text in texts:
+        batch.append(text)
+        n_chars += len(text)
+        if (len(batch) >= chunksize) if chunksize else (n_chars >= batch_chars):
+            yield batch
+            batch = []
+            n_chars = 0
+    if batch:
+        yield batch
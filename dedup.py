@@ -0,0 +1,196 @@
+from collections import defaultdict
+from typing import Any
+from typing import Dict
+from typing import Generator
+from typing import Hashable
+from typing import Iterable
+from typing import List
+from typing import Set
+from typing import Tuple
+from typing import Union
+
+import numpy as np
+
+from tokenizer import TokenArray
+from tokenizer import _mix64_numpy
+from tokenizer import text_n_gram_hashes
+from tokenizer import word_n_gram_hashes
+
+# shingle hashes * permutations processed at a time, bounds the temporary array at 16MB
+_BLOCK_SIZE = 1 << 21
+
+
+def _shingle_hashes(text: Union[str, TokenArray], n: int, shingles: str) -> np.ndarray:
+    # a document shorter than n gets all its shorter n-grams instead, so that short documents can still match
+    # (n-gram hashes of different sizes never collide, so they can't match a longer document's n-grams by accident)
+    if shingles == 'word':
+        hashes = word_n_gram_hashes(text, n, split_sentences=False, as_numpy=True)
+        if not len(hashes) and n > 1:
+            hashes = word_n_gram_hashes(text, 1, n - 1, split_sentences=False, as_numpy=True)
+    elif shingles == 'char':
+        text = text.text if isinstance(text, TokenArray) else text
+        hashes = text_n_gram_hashes(text, n, as_numpy=True)
+        if not len(hashes) and n > 1:
+            hashes = text_n_gram_hashes(text, 1, n - 1, as_numpy=True)
+    else:
+        raise ValueError(f'unknown shingles: {shingles!r}')
+    return hashes
+
+
+def _is_empty_signature(signature: np.ndarray) -> bool:
+    return bool((signature == np.iinfo(np.uint64).max).all())
+
+
+def minhash_signatures(shingle_hashes: List[np.ndarray], seeds: np.ndarray) -> np.ndarray:
+    """
+    minhash signatures of many documents at once, as a (documents, permutations) uint64 array
+    each permutation xors every shingle hash with its seed and then remixes it, and the signature is the minimum
+    all shingles of all documents are permuted together in large vectorized blocks
+    documents without any shingles get a signature of all 0xFFFFFFFFFFFFFFFF
+
+    :param shingle_hashes: 64-bit shingle hashes of each document (e.g. from `word_n_gram_hashes`)
+    :param seeds: one uint64 seed per permutation
+    """
+    signatures = np.full((len(shingle_hashes), len(seeds)), np.iinfo(np.uint64).max, dtype=np.uint64)
+    if not shingle_hashes:
+        return signatures
+    lengths = np.fromiter(map(len, shingle_hashes), dtype=np.int64, count=len(shingle_hashes))
+    doc_idxs = np.repeat(np.arange(len(shingle_hashes)), lengths)
+    all_hashes = np.concatenate(shingle_hashes).astype(np.uint64, copy=False)
+
+    block_rows = max(1, _BLOCK_SIZE // max(1, len(seeds)))
+    for block_start in range(0, len(all_hashes), block_rows):
+        block_docs = doc_idxs[block_start:block_start + block_rows]
+        permuted = _mix64_numpy(all_hashes[block_start:block_start + block_rows, None] ^ seeds[None, :])
+
+        # rows are grouped by document, so reduce each document's run of rows (a document may span blocks)
+        run_starts = np.flatnonzero(np.concatenate(([True], block_docs[1:] != block_docs[:-1])))
+        docs = block_docs[run_starts]
+        signatures[docs] = np.minimum(signatures[docs], np.minimum.reduceat(permuted, run_starts, axis=0))
+    return signatures
+
+
+class MinHashLSH:
+    """
+    in-memory index of minhash signatures, bucketed by banded locality-sensitive hashing
+    two documents with jaccard similarity s share at least one bucket with probability 1 - (1 - s ** rows) ** bands,
+    so with the defaults (32 bands of 4 rows) that's about 0.5 at s=0.38, and 0.99 at s=0.6
+    documents shorter than n are shingled with all their shorter n-grams instead, and documents without any words
+    (or chars) are indexed but never bucketed, since their empty signatures would all collide with each other
+    """
+
+    def __init__(self,
+                 num_perm: int = 128,
+                 bands: int = 32,
+                 n: int = 3,
+                 shingles: str = 'word',
+                 seed: int = 0,
+                 ):
+        """
+        :param num_perm: signature length
+        :param bands: number of LSH bands, must divide num_perm
+        :param n: shingle (n-gram) length
+        :param shingles: 'word' for word n-grams, or 'char' for char n-grams
+        :param seed: for the permutations, signatures are only comparable between indexes with the same seed
+        """
+        assert num_perm % bands == 0
+        if shingles not in {'word', 'char'}:
+            raise ValueError(f'unknown shingles: {shingles!r}')
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.n = n
+        self.shingles = shingles
+        self.seeds = np.random.default_rng(seed).integers(0, 1 << 64, size=num_perm, dtype=np.uint64)
+        self.signatures: Dict[Hashable, np.ndarray] = dict()
+        self._buckets: List[Dict[bytes, List[Hashable]]] = [defaultdict(list) for _ in range(bands)]
+
+    def __len__(self) -> int:
+        return len(self.signatures)
+
+    def __contains__(self, doc_id: Hashable) -> bool:
+        return doc_id in self.signatures
+
+    def _band_keys(self, signature: np.ndarray) -> Generator[bytes, Any, None]:
+        for band_start in range(0, self.num_perm, self.rows):
+            yield signature[band_start:band_start + self.rows].tobytes()
+
+    def signature(self, text: Union[str, TokenArray]) -> np.ndarray:
+        return minhash_signatures([_shingle_hashes(text, self.n, self.shingles)], self.seeds)[0]
+
+    def add_signature(self, doc_id: Hashable, signature: np.ndarray):
+        if doc_id in self.signatures:
+            raise KeyError(f'duplicate doc_id: {doc_id!r}')
+        self.signatures[doc_id] = signature
+        if _is_empty_signature(signature):
+            return
+        for buckets, key in zip(self._buckets, self._band_keys(signature)):
+            buckets[key].append(doc_id)
+
+    def add(self, doc_id: Hashable, text: Union[str, TokenArray]):
+        self.add_signature(doc_id, self.signature(text))
+
+    def build(self, docs: Iterable[Tuple[Hashable, Union[str, TokenArray]]], batch_size: int = 1024):
+        """
+        bulk add (doc_id, text) pairs, computing the signatures of each batch of documents together
+        """
+        batch = []
+        for doc in docs:
+            batch.append(doc)
+            if len(batch) >= batch_size:
+                self._add_batch(batch)
+                batch = []
+        if batch:
+            self._add_batch(batch)
+
+    def _add_batch(self, batch: List[Tuple[Hashable, Union[str, TokenArray]]]):
+        signatures = minhash_signatures([_shingle_hashes(text, self.n, self.shingles) for _, text in batch],
+                                        self.seeds)
+        for (doc_id, _), signature in zip(batch, signatures):
+            self.add_signature(doc_id, signature)
+
+    def query_signature(self, signature: np.ndarray, min_similarity: float = 0.0) -> List[Tuple[Hashable, float]]:
+        if _is_empty_signature(signature):
+            return []
+        candidates: Set[Hashable] = set()
+        for buckets, key in zip(self._buckets, self._band_keys(signature)):
+            candidates.update(buckets.get(key, ()))
+
+        results = []
+        for doc_id in candidates:
+            similarity = float(np.count_nonzero(self.signatures[doc_id] == signature)) / self.num_perm
+            if similarity >= min_similarity:
+                results.append((doc_id, similarity))
+        return sorted(results, key=lambda result: result[1], reverse=True)
+
+    def query(self, text: Union[str, TokenArray], min_similarity: float = 0.0) -> List[Tuple[Hashable, float]]:
+        """
+        find indexed documents sharing at least one LSH bucket with the text
+
+        :param text: to look up
+        :param min_similarity: drop candidates with a lower estimated jaccard similarity
+        :return: (doc_id, estimated jaccard similarity), most similar first
+        """
+        return self.query_signature(self.signature(text), min_similarity)
+
+    def candidate_pairs(self, min_similarity: float = 0.0) -> Generator[Tuple[Hashable, Hashable, float], Any, None]:
+        """
+        every pair of indexed documents sharing at least one LSH bucket (each pair only once, in insertion order)
+        yields (doc_id, other doc_id, estimated jaccard similarity)
+        """
+        order = {doc_id: idx for idx, doc_id in enumerate(self.signatures)}
+        seen: Set[Tuple[Hashable, Hashable]] = set()
+        for buckets in self._buckets:
+            for doc_ids in buckets.values():
+                for idx, doc_id in enumerate(doc_ids):
+                    for other_doc_id in doc_ids[idx + 1:]:
+                        pair = (doc_id, other_doc_id)
+                        if order[doc_id] > order[other_doc_id]:
+                            pair = (other_doc_id, doc_id)
+                        if pair in seen:
+                            continue
+                        seen.add(pair)
+                        similarity = float(np.count_nonzero(self.signatures[doc_id] ==
+                                                            self.signatures[other_doc_id])) / self.num_perm
+                        if similarity >= min_similarity:
+                            yield pair[0], pair[1], similarity
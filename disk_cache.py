@@ -0,0 +1,40 @@
+import os
+import tempfile
+from typing import Optional
+
+# generated tables are cached here, since generating one means looking at every codepoint
+CACHE_DIR = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'), 'tokenizer')
+
+
+def cache_path(filename: str) -> str:
+    return os.path.join(CACHE_DIR, filename)
+
+
+def read_cache_file(path: str) -> Optional[bytes]:
+    """
+    contents of a cache file, or None if it can't be read (the caller should rebuild it)
+    """
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def write_cache_file(path: str, data: bytes):
+    """
+    write to a temp file and rename it, so concurrent workers never see a partially written file
+    errors are ignored (e.g. read-only home directory), since the caller can just rebuild it next time
+    """
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with open(fd, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+    except OSError:
+        pass
@@ -0,0 +1,212 @@
+import heapq
+import json
+from array import array
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Tuple
+from typing import Union
+
+import numpy as np
+
+from tokenizer import Token
+from tokenizer import TokenCategory
+from tokenizer import stable_hash
+
+NGram = Union[str, Tuple[str, ...]]
+
+# rough memory per tracked n-gram (dict entries, heap entry, and the tuple of strings itself)
+_BYTES_PER_ITEM = 256
+
+# hashes buffered before they are added to the sketch in one vectorized update
+_FLUSH_SIZE = 1 << 16
+
+
+def _item_hash(item: NGram) -> int:
+    # stable across processes, so sketches from different workers can be merged
+    return stable_hash(item if isinstance(item, str) else '\x00'.join(item))
+
+
+class HeavyHitters:
+    """
+    bounded-memory n-gram frequencies for streams that are too big for a `Counter`
+    a count-min sketch estimates the count of any n-gram (never an underestimate, overestimates are rare and small),
+    and a space-saving summary tracks the n-grams that are likely the most frequent, with their counts
+    two HeavyHitters with the same parameters can be merged, e.g. after counting in parallel workers
+    """
+
+    def __init__(self,
+                 memory_bytes: int = 64 << 20,
+                 depth: int = 4,
+                 width: Optional[int] = None,
+                 capacity: Optional[int] = None,
+                 ):
+        """
+        by default, half the memory budget goes to the sketch and half to the top n-grams
+
+        :param memory_bytes: approximate memory budget
+        :param depth: number of hash rows in the sketch, error probability falls exponentially with depth
+        :param width: counters per row (overrides the memory budget), error is about total / width
+        :param capacity: number of top n-grams to track (overrides the memory budget)
+        """
+        self.depth = depth
+        self.width = width or max(1, memory_bytes // 2 // (8 * depth))
+        self.capacity = capacity or max(1, memory_bytes // 2 // _BYTES_PER_ITEM)
+        self.table = np.zeros((self.depth, self.width), dtype=np.uint64)
+        self.total = 0
+
+        # space-saving summary, the heap may contain stale entries that no longer match `counts`
+        self.counts: Dict[NGram, int] = dict()
+        self.errors: Dict[NGram, int] = dict()  # max overestimate of each count
+        self._heap: List[Tuple[int, NGram]] = []
+
+        self._pending_hashes = array('Q')
+        self._pending_counts = array('Q')
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+    def _flush(self):
+        if not self._pending_hashes:
+            return
+        hashes = np.frombuffer(self._pending_hashes, dtype=np.uint64)
+        counts = np.frombuffer(self._pending_counts, dtype=np.uint64)
+
+        # derive all the row hashes from one 64-bit hash (kirsch-mitzenmacher double hashing)
+        step = (hashes >> np.uint64(32)) | np.uint64(1)
+        for row in range(self.depth):
+            np.add.at(self.table[row], (hashes + np.uint64(row) * step) % np.uint64(self.width), counts)
+
+        self._pending_hashes = array('Q')
+        self._pending_counts = array('Q')
+
+    def _row_indices(self, item: NGram) -> List[int]:
+        item_hash = _item_hash(item)
+        step = (item_hash >> 32) | 1
+        return [(item_hash + row * step) % (1 << 64) % self.width for row in range(self.depth)]
+
+    def _pop_min(self) -> Tuple[int, NGram]:
+        while True:
+            count, item = heapq.heappop(self._heap)
+            if self.counts.get(item) == count:
+                return count, item
+
+    def _push(self, item: NGram):
+        heapq.heappush(self._heap, (self.counts[item], item))
+
+        # drop the stale entries before the heap grows too large
+        if len(self._heap) > 4 * self.capacity:
+            self._heap = [(count, item) for item, count in self.counts.items()]
+            heapq.heapify(self._heap)
+
+    def add(self, item: NGram, count: int = 1):
+        self._pending_hashes.append(_item_hash(item))
+        self._pending_counts.append(count)
+        if len(self._pending_hashes) >= _FLUSH_SIZE:
+            self._flush()
+        self.total += count
+
+        if item in self.counts:
+            self.counts[item] += count
+        elif len(self.counts) < self.capacity:
+            self.counts[item] = count
+            self.errors[item] = 0
+        else:
+            # replace the least frequent n-gram, which is the most the new n-gram could have been missed by
+            min_count, min_item = self._pop_min()
+            del self.counts[min_item]
+            del self.errors[min_item]
+            self.counts[item] = min_count + count
+            self.errors[item] = min_count
+        self._push(item)
+
+    def update(self, n_grams: Iterable[NGram]):
+        """
+        count n-grams, e.g. from `word_n_grams`
+        """
+        for n_gram in n_grams:
+            self.add(n_gram)
+
+    def update_sentences(self, sentences: Iterable[List[Token]], n: int = 2):
+        """
+        count word n-grams in each sentence, e.g. from `sentence_split_tokens`
+        """
+        for sentence_tokens in sentences:
+            words = [token.text for token in sentence_tokens if token.category is TokenCategory.WORD]
+            self.update(zip(*[words[i:] for i in range(n)]))
+
+    def estimate(self, item: NGram) -> int:
+        """
+        upper bound on the count of an n-gram
+        """
+        self._flush()
+        estimate = min(int(self.table[row, idx]) for row, idx in enumerate(self._row_indices(item)))
+        if item in self.counts:
+            estimate = min(estimate, self.counts[item])
+        return estimate
+
+    def top(self, k: Optional[int] = None) -> List[Tuple[NGram, int, int]]:
+        """
+        the k most frequent n-grams, as (n-gram, count, error), where the true count is between count - error and count
+        """
+        items = sorted(self.counts.items(), key=lambda item: item[1], reverse=True)
+        return [(item, count, self.errors[item]) for item, count in items[:k]]
+
+    def _min_count(self) -> int:
+        # any untracked n-gram might have been counted up to this many times
+        return min(self.counts.values()) if len(self.counts) >= self.capacity else 0
+
+    def merge(self, other: 'HeavyHitters'):
+        """
+        add the counts of another HeavyHitters (with the same depth, width, and capacity) into this one
+        """
+        assert (self.depth, self.width, self.capacity) == (other.depth, other.width, other.capacity)
+        self._flush()
+        other._flush()
+        self.table += other.table
+        self.total += other.total
+
+        # mergeable space-saving: an untracked n-gram is assumed to have the other summary's min count
+        self_min, other_min = self._min_count(), other._min_count()
+        counts = dict()
+        errors = dict()
+        for item in self.counts.keys() | other.counts.keys():
+            counts[item] = self.counts.get(item, self_min) + other.counts.get(item, other_min)
+            errors[item] = self.errors.get(item, self_min) + other.errors.get(item, other_min)
+        top_items = heapq.nlargest(self.capacity, counts, key=counts.__getitem__)
+        self.counts = {item: counts[item] for item in top_items}
+        self.errors = {item: errors[item] for item in top_items}
+        self._heap = [(count, item) for item, count in self.counts.items()]
+        heapq.heapify(self._heap)
+
+    def save(self, path: str):
+        """
+        write to a single .npz file (without pickling), see `load`
+        """
+        self._flush()
+        items = [[item, self.counts[item], self.errors[item]] for item in self.counts]
+        metadata = {'depth': self.depth, 'width': self.width, 'capacity': self.capacity, 'total': self.total}
+        with open(path, 'wb') as f:
+            np.savez(f,
+                     table=self.table,
+                     metadata=np.frombuffer(json.dumps(metadata).encode('utf8'), dtype=np.uint8),
+                     items=np.frombuffer(json.dumps(items, ensure_ascii=False).encode('utf8'), dtype=np.uint8))
+
+    @classmethod
+    def load(cls, path: str) -> 'HeavyHitters':
+        with np.load(path, allow_pickle=False) as data:
+            metadata = json.loads(data['metadata'].tobytes().decode('utf8'))
+            items = json.loads(data['items'].tobytes().decode('utf8'))
+            table = data['table']
+
+        heavy_hitters = cls(depth=metadata['depth'], width=metadata['width'], capacity=metadata['capacity'])
+        heavy_hitters.table = table
+        heavy_hitters.total = metadata['total']
+        for item, count, error in items:
+            item = item if isinstance(item, str) else tuple(item)  # json turns tuples into lists
+            heavy_hitters.counts[item] = count
+            heavy_hitters.errors[item] = error
+        heavy_hitters._heap = [(count, item) for item, count in heavy_hitters.counts.items()]
+        heapq.heapify(heavy_hitters._heap)
+        return heavy_hitters
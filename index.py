@@ -0,0 +1,281 @@
+import json
+import mmap
+import sys
+from array import array
+from collections import defaultdict
+from typing import Any
+from typing import Dict
+from typing import Generator
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Tuple
+from typing import Union
+
+from tokenizer import Token
+from tokenizer import TokenCategory
+from tokenizer import unicode_tokenize
+
+# file layout: magic, header length (8 bytes, little-endian), json header, postings offsets (array('Q')), postings
+_MAGIC = b'TOKIDX01'
+
+# (doc_id, [(start, end), ...]) for every matching document, where start and end are char offsets in the document
+Matches = List[Tuple[int, List[Tuple[int, int]]]]
+
+
+def _encode_varint(value: int, out: bytearray):
+    # little-endian base 128, 7 bits per byte with the high bit set on all but the last byte
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _decode_varints(data: Union[bytes, bytearray, memoryview]) -> Generator[int, Any, None]:
+    value = 0
+    shift = 0
+    for byte in data:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            yield value
+            value = 0
+            shift = 0
+
+
+class InvertedIndex:
+    """
+    positional inverted index of words, like an fts5 table with the unicode61 tokenizer, but in-process
+    for each term, the postings are a single varint-encoded byte string of
+    (doc_id delta, number of occurrences, and for each occurrence: word position delta, start offset delta, length)
+    word positions count words only, so a phrase matches across any whitespace/punctuation between its words
+    """
+
+    def __init__(self, casefold: bool = True):
+        """
+        :param casefold: make terms (and queries) case-insensitive
+        """
+        self.casefold = casefold
+        self.term_ids: Dict[str, int] = dict()
+        self.postings: List[Union[bytearray, memoryview]] = []
+        self.doc_count = 0
+        self._last_doc_ids = array('q')  # per term, for the doc_id deltas
+        self._last_doc_id = -1
+        self._mmap: Optional[mmap.mmap] = None
+        self._view: Optional[memoryview] = None
+
+    def __len__(self) -> int:
+        return self.doc_count
+
+    def __contains__(self, term: str) -> bool:
+        return self._normalize(term) in self.term_ids
+
+    def _normalize(self, term: str) -> str:
+        return term.casefold() if self.casefold else term
+
+    def add(self, doc_id: int, text: str):
+        """
+        index a document, doc_ids must be added in increasing order
+        """
+        self.add_tokens(doc_id, unicode_tokenize(text, words_only=True, as_tokens=True, engine='run'))
+
+    def add_tokens(self, doc_id: int, tokens: Iterable[Token]):
+        """
+        index an already-tokenized document (e.g. from `unicode_tokenize(text, as_tokens=True)`)
+        """
+        if self._mmap is not None:
+            raise TypeError('cannot add to an index loaded from a file')
+        if doc_id <= self._last_doc_id:
+            raise ValueError(f'doc_id must be increasing, got {doc_id} after {self._last_doc_id}')
+        self._last_doc_id = doc_id
+        self.doc_count += 1
+
+        occurrences: Dict[str, List[Tuple[int, int, int]]] = defaultdict(list)
+        position = 0
+        for token in tokens:
+            if token.category is TokenCategory.WORD:
+                occurrences[self._normalize(token.text)].append((position, token.start_pos, len(token.text)))
+                position += 1
+
+        for term, term_occurrences in occurrences.items():
+            term_id = self.term_ids.get(term)
+            if term_id is None:
+                term_id = self.term_ids[sys.intern(term)] = len(self.postings)
+                self.postings.append(bytearray())
+                self._last_doc_ids.append(-1)
+
+            postings = self.postings[term_id]
+            _encode_varint(doc_id - self._last_doc_ids[term_id] - 1, postings)
+            _encode_varint(len(term_occurrences), postings)
+            last_position = 0
+            last_start = 0
+            for position, start, length in term_occurrences:
+                _encode_varint(position - last_position, postings)
+                _encode_varint(start - last_start, postings)
+                _encode_varint(length, postings)
+                last_position = position
+                last_start = start
+            self._last_doc_ids[term_id] = doc_id
+
+    def _iter_postings(self, term: str) -> Generator[Tuple[int, List[Tuple[int, int, int]]], Any, None]:
+        """
+        yields (doc_id, [(position, start, end), ...]) for each document containing an (already normalized) term
+        """
+        term_id = self.term_ids.get(term)
+        if term_id is None:
+            return
+        values = _decode_varints(self.postings[term_id])
+        doc_id = -1
+        for doc_delta in values:
+            doc_id += doc_delta + 1
+            position = 0
+            start = 0
+            term_occurrences = []
+            for _ in range(next(values)):
+                position += next(values)
+                start += next(values)
+                term_occurrences.append((position, start, start + next(values)))
+            yield doc_id, term_occurrences
+
+    def _query_terms(self, query: str) -> List[str]:
+        return [self._normalize(word) for word in unicode_tokenize(query, words_only=True)]
+
+    def search(self, term: str) -> Matches:
+        """
+        documents containing a term, with the (start, end) offsets of each occurrence
+        """
+        return [(doc_id, [(start, end) for _, start, end in term_occurrences])
+                for doc_id, term_occurrences in self._iter_postings(self._normalize(term))]
+
+    def _documents(self, terms: List[str]) -> Dict[int, List[List[Tuple[int, int, int]]]]:
+        # occurrences of each term in the documents containing all the terms, rarest term first to keep this small
+        unique_terms = sorted(set(terms), key=lambda term: len(self.postings[self.term_ids[term]]))
+        documents = {doc_id: {unique_terms[0]: term_occurrences}
+                     for doc_id, term_occurrences in self._iter_postings(unique_terms[0])}
+        for term in unique_terms[1:]:
+            next_documents = dict()
+            for doc_id, term_occurrences in self._iter_postings(term):
+                if doc_id in documents:
+                    documents[doc_id][term] = term_occurrences
+                    next_documents[doc_id] = documents[doc_id]
+            documents = next_documents
+        return {doc_id: [term_occurrences[term] for term in terms] for doc_id, term_occurrences in documents.items()}
+
+    def phrase(self, query: str) -> Matches:
+        """
+        documents containing the words of the query in order, with the (start, end) offsets of each match
+        """
+        terms = self._query_terms(query)
+        if not terms or any(term not in self.term_ids for term in terms):
+            return []
+
+        matches = []
+        for doc_id, occurrences in sorted(self._documents(terms).items()):
+            # keyed by the position where the phrase would start, narrowed down one word at a time
+            starts = {position: start for position, start, _ in occurrences[0]}
+            ends = {position: end for position, _, end in occurrences[0]}
+            for offset, term_occurrences in enumerate(occurrences[1:], start=1):
+                ends = {position - offset: end for position, _, end in term_occurrences if position - offset in starts}
+                starts = {position: start for position, start in starts.items() if position in ends}
+            if starts:
+                matches.append((doc_id, [(start, ends[position]) for position, start in sorted(starts.items())]))
+        return matches
+
+    def near(self, query: str, distance: int = 10) -> Matches:
+        """
+        documents containing all the words of the query (in any order) with at most `distance` other words between
+        them, like fts5's NEAR(), with the (start, end) offsets of each smallest window containing all the words
+        """
+        terms = list(dict.fromkeys(self._query_terms(query)))
+        if not terms or any(term not in self.term_ids for term in terms):
+            return []
+
+        matches = []
+        for doc_id, occurrences in sorted(self._documents(terms).items()):
+            # sliding window over all occurrences of all the terms, in position order
+            merged = sorted((position, start, end, term_idx)
+                            for term_idx, term_occurrences in enumerate(occurrences)
+                            for position, start, end in term_occurrences)
+            counts = [0] * len(terms)
+            missing = len(terms)
+            windows = []
+            left = 0
+            for right, (position, _, end, term_idx) in enumerate(merged):
+                counts[term_idx] += 1
+                missing -= counts[term_idx] == 1
+
+                # shrink the window from the left while it still contains every term
+                while missing == 0 and counts[merged[left][3]] > 1:
+                    counts[merged[left][3]] -= 1
+                    left += 1
+                if missing == 0 and position - merged[left][0] + 1 - len(terms) <= distance:
+                    windows.append((merged[left][1], end))
+
+            if windows:
+                matches.append((doc_id, windows))
+        return matches
+
+    def save(self, path: str):
+        """
+        write the whole index to a single file, see `load`
+        """
+        terms = sorted(self.term_ids, key=self.term_ids.__getitem__)
+        header = json.dumps({'casefold': self.casefold,
+                             'doc_count': self.doc_count,
+                             'last_doc_id': self._last_doc_id,
+                             'terms': terms}, ensure_ascii=False).encode('utf8', 'surrogatepass')
+        offsets = array('Q', [0])
+        for postings in self.postings:
+            offsets.append(offsets[-1] + len(postings))
+        if sys.byteorder != 'little':
+            offsets.byteswap()
+
+        with open(path, 'wb') as f:
+            f.write(_MAGIC)
+            f.write(len(header).to_bytes(8, 'little'))
+            f.write(header)
+            f.write(offsets.tobytes())
+            for postings in self.postings:
+                f.write(postings)
+
+    @classmethod
+    def load(cls, path: str) -> 'InvertedIndex':
+        """
+        memory-map an index written by `save`, postings are only read from disk when they are queried
+        the loaded index is read-only, and should be closed when it's no longer needed
+        """
+        with open(path, 'rb') as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if mm[:len(_MAGIC)] != _MAGIC:
+            mm.close()
+            raise ValueError(f'not an index file: {path!r}')
+        header_start = len(_MAGIC) + 8
+        header_end = header_start + int.from_bytes(mm[len(_MAGIC):header_start], 'little')
+        header = json.loads(mm[header_start:header_end].decode('utf8', 'surrogatepass'))
+
+        offsets = array('Q', mm[header_end:header_end + 8 * (len(header['terms']) + 1)])
+        if sys.byteorder != 'little':
+            offsets.byteswap()
+        postings_start = header_end + 8 * len(offsets)
+        view = memoryview(mm)
+
+        index = cls(casefold=header['casefold'])
+        index.doc_count = header['doc_count']
+        index._last_doc_id = header['last_doc_id']
+        index.term_ids = {sys.intern(term): term_id for term_id, term in enumerate(header['terms'])}
+        index.postings = [view[postings_start + offsets[idx]:postings_start + offsets[idx + 1]]
+                          for idx in range(len(header['terms']))]
+        index._mmap = mm
+        index._view = view
+        return index
+
+    def close(self):
+        if self._mmap is not None:
+            for postings in self.postings:
+                postings.release()
+            self._view.release()
+            self._mmap.close()
+            self.postings = []
+            self.term_ids = dict()
+            self._mmap = None
@@ -0,0 +1,121 @@
+from collections import deque
+from functools import lru_cache
+from functools import partial
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import Generator
+from typing import Iterable
+from typing import List
+from typing import Tuple
+
+from regex_tokenizer import _preprocess
+from tokenizer import unicode_tokenize
+
+
+class KeywordMatcher:
+    """
+    finds many keywords (words or multi-word phrases) in a text in a single pass, using aho-corasick over word ids
+    keywords and texts are both split with `unicode_tokenize`, so keywords only match whole words,
+    and a phrase matches across any whitespace/punctuation between its words
+    each word is normalized separately, so matches are reported with offsets into the original text
+    """
+
+    def __init__(self,
+                 keywords: Iterable[str],
+                 nfkd: bool = False,
+                 casefold: bool = False,
+                 replace_ascii: bool = False,
+                 ):
+        """
+        :param keywords: words or phrases to find
+        :param nfkd: see `regex_tokenizer.word_tokenize`
+        :param casefold: see `regex_tokenizer.word_tokenize`
+        :param replace_ascii: see `regex_tokenizer.word_tokenize`
+        """
+        if nfkd or casefold or replace_ascii:
+            self._normalize: Callable[[str], str] = lru_cache(maxsize=1 << 16)(
+                partial(_preprocess, nfkd=nfkd, casefold=casefold, replace_ascii=replace_ascii))
+        else:
+            self._normalize = str
+
+        self.keywords: List[str] = []
+        self.word_ids: Dict[str, int] = dict()
+
+        # the trie, where node 0 is the root
+        self._goto: List[Dict[int, int]] = [dict()]
+        self._fail: List[int] = [0]
+        self._outputs: List[Tuple[int, ...]] = [()]  # indices of keywords ending at this node, including via fail links
+        self._lengths: List[int] = []  # number of words in each keyword
+
+        for keyword in keywords:
+            words = [self._normalize(word) for word in unicode_tokenize(keyword, words_only=True)]
+            if not words:
+                continue
+            node = 0
+            for word in words:
+                word_id = self.word_ids.setdefault(word, len(self.word_ids))
+                next_node = self._goto[node].get(word_id)
+                if next_node is None:
+                    next_node = self._goto[node][word_id] = len(self._goto)
+                    self._goto.append(dict())
+                    self._fail.append(0)
+                    self._outputs.append(())
+                node = next_node
+            self._outputs[node] += (len(self.keywords),)
+            self.keywords.append(keyword)
+            self._lengths.append(len(words))
+        self.max_length = max(self._lengths, default=0)
+
+        # breadth-first, so the fail link of a node's parent (which is shallower) is always already known
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for word_id, child in self._goto[node].items():
+                fail = self._fail[node]
+                while fail and word_id not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(word_id, 0) if node else 0
+                self._outputs[child] += self._outputs[self._fail[child]]
+                queue.append(child)
+
+    def __len__(self) -> int:
+        return len(self.keywords)
+
+    def iter_matches(self, text: str) -> Generator[Tuple[str, int, int], Any, None]:
+        """
+        every occurrence of every keyword (including overlapping ones), in order of where they end
+
+        :param text: to search
+        :return: (keyword, start, end), where `text[start:end]` is the matched (un-normalized) text
+        """
+        goto = self._goto
+        fail = self._fail
+        outputs = self._outputs
+        lengths = self._lengths
+        keywords = self.keywords
+        get_word_id = self.word_ids.get
+        normalize = self._normalize
+
+        starts = deque(maxlen=self.max_length)  # start offsets of the most recent words
+        node = 0
+        for token in unicode_tokenize(text, words_only=True, as_tokens=True, engine='run'):
+            starts.append(token.start_pos)
+            word_id = get_word_id(normalize(token.text))
+            if word_id is None:
+                node = 0  # no keyword contains this word
+                continue
+            while node and word_id not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(word_id, 0)
+            for keyword_idx in outputs[node]:
+                yield keywords[keyword_idx], starts[-lengths[keyword_idx]], token.start_pos + len(token.text)
+
+    def find_all(self, text: str) -> List[Tuple[str, int, int]]:
+        return list(self.iter_matches(text))
+
+    def contains(self, text: str) -> bool:
+        """
+        whether the text contains any keyword, stopping at the first match
+        """
+        return next(self.iter_matches(text), None) is not None
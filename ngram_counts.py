@@ -0,0 +1,228 @@
+import heapq
+import os
+import queue
+import tempfile
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from itertools import groupby
+from multiprocessing import Process
+from multiprocessing import Queue
+from typing import Any
+from typing import Dict
+from typing import Generator
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Tuple
+from zlib import crc32
+
+from batching import batches
+from tokenizer import word_n_grams
+
+# each line of a run (or the final count file) is the n-gram's words and then its count, all separated by tabs
+# words never contain whitespace, so sorting these lines as strings is the same as sorting the n-gram tuples
+_ENCODING = 'utf8'
+_ERRORS = 'surrogatepass'
+
+# max number of runs that are merged at once, more runs are merged in several passes
+_MAX_OPEN_RUNS = 128
+
+# how often to check that the workers are still alive while waiting on them
+_POLL_SECONDS = 1.0
+
+
+def _write_run(items: Iterable[Tuple[str, int]], directory: str, suffix: str) -> str:
+    fd, path = tempfile.mkstemp(suffix=suffix, dir=directory)
+    with open(fd, 'w', encoding=_ENCODING, errors=_ERRORS, newline='\n') as f:
+        f.writelines(f'{key}\t{count}\n' for key, count in items)
+    return path
+
+
+def _read_run(path: str) -> Generator[Tuple[str, int], Any, None]:
+    with open(path, encoding=_ENCODING, errors=_ERRORS, newline='\n') as f:
+        for line in f:
+            key, _, count = line[:-1].rpartition('\t')
+            yield key, int(count)
+
+
+def _merge_runs(paths: List[str], directory: str, suffix: str) -> str:
+    """
+    k-way merge of sorted runs into a single sorted run (summing the counts of equal keys), deleting the inputs
+    """
+    while len(paths) > _MAX_OPEN_RUNS:
+        paths = paths[_MAX_OPEN_RUNS:] + [_merge_runs(paths[:_MAX_OPEN_RUNS], directory, suffix)]
+
+    merged = heapq.merge(*map(_read_run, paths))
+    path = _write_run(((key, sum(count for _, count in group)) for key, group in groupby(merged, lambda item: item[0])),
+                      directory, suffix)
+    for run_path in paths:
+        os.remove(run_path)
+    return path
+
+
+class _ShardedCounter:
+    """
+    exact n-gram counts for one worker, spilled to sorted runs (one per hash shard) whenever they get too big
+    """
+
+    def __init__(self, directory: str, options: Dict[str, Any]):
+        self.directory = directory
+        self.n = options['n']
+        self.split_sentences = options['split_sentences']
+        self.merge_apostrophe_word = options['merge_apostrophe_word']
+        self.max_items = options['max_items']
+        self.counters: List[Counter] = [Counter() for _ in range(options['shards'])]
+        self.runs: List[Tuple[int, str]] = []  # (shard, path)
+
+    def add_texts(self, texts: Iterable[str]):
+        counters = self.counters
+        for text in texts:
+            for n_gram in word_n_grams(text, self.n, self.split_sentences, self.merge_apostrophe_word):
+                key = '\t'.join(n_gram)
+                counters[crc32(key.encode(_ENCODING, _ERRORS)) % len(counters)][key] += 1
+            if sum(map(len, counters)) >= self.max_items:
+                self.spill()
+
+    def spill(self):
+        for shard, counter in enumerate(self.counters):
+            if counter:
+                self.runs.append((shard, _write_run(sorted(counter.items()), self.directory, f'.{shard}.run')))
+                counter.clear()
+
+
+def _count_worker(task_queue: Queue, result_queue: Queue, directory: str, options: Dict[str, Any]):
+    try:
+        counter = _ShardedCounter(directory, options)
+        for batch in iter(task_queue.get, None):
+            counter.add_texts(batch)
+        counter.spill()
+        result_queue.put(counter.runs)
+    except BaseException as e:
+        result_queue.put(e)
+        raise
+
+
+def _check_workers(processes: List[Process]):
+    # a worker that was killed (e.g. by the oom killer) never reports back, so waiting on it would hang forever
+    for process in processes:
+        if process.exitcode:
+            raise RuntimeError(f'n-gram counting worker exited with code {process.exitcode}')
+
+
+def _put_task(task_queue: Queue, task: Optional[List[str]], processes: List[Process]):
+    while True:
+        try:
+            task_queue.put(task, timeout=_POLL_SECONDS)
+            return
+        except queue.Full:
+            _check_workers(processes)
+
+
+def _get_result(result_queue: Queue, processes: List[Process]) -> List[Tuple[int, str]]:
+    while True:
+        try:
+            result = result_queue.get(timeout=_POLL_SECONDS)
+        except queue.Empty:
+            _check_workers(processes)
+            continue
+        if isinstance(result, BaseException):
+            raise result
+        return result
+
+
+def _merge_shard(args: Tuple[List[str], str, int]) -> str:
+    paths, directory, shard = args
+    if not paths:
+        return _write_run([], directory, f'.{shard}.counts')
+    return _merge_runs(paths, directory, f'.{shard}.counts')
+
+
+def count_n_grams(texts: Iterable[str],
+                  output_path: str,
+                  n: int = 2,
+                  split_sentences: bool = True,
+                  merge_apostrophe_word: bool = False,
+                  workers: Optional[int] = None,
+                  shards: Optional[int] = None,
+                  max_items: int = 1 << 21,
+                  tmp_dir: Optional[str] = None,
+                  ) -> str:
+    """
+    exact counts of every word n-gram in a corpus that may be much larger than memory (map-reduce on one machine)
+    each worker process counts n-grams into hash shards, and spills them to sorted runs on disk when it holds
+    max_items distinct n-grams; then each shard's runs are k-way merged in parallel, and finally the (disjoint)
+    shards are merged into a single file sorted by n-gram, which can be streamed back with `read_n_gram_counts`
+
+    :param texts: iterable of str, consumed lazily
+    :param output_path: where to write the final counts
+    :param n: how long is the n-gram
+    :param split_sentences: don't allow n-grams to span sentences
+    :param merge_apostrophe_word: see tokenize function
+    :param workers: number of processes, defaults to the cpu count (use 1 to count in this process)
+    :param shards: number of hash shards to merge in parallel, defaults to the number of workers
+    :param max_items: distinct n-grams held by each worker before spilling, at roughly 150 bytes each
+    :param tmp_dir: for the temporary runs (needs about as much space as the output, and then some)
+    :return: output_path
+    """
+    workers = workers or os.cpu_count() or 1
+    options = {'n': n,
+               'split_sentences': split_sentences,
+               'merge_apostrophe_word': merge_apostrophe_word,
+               'max_items': max_items,
+               'shards': shards or workers}
+
+    with tempfile.TemporaryDirectory(dir=tmp_dir) as directory:
+        # map: count and spill sorted runs
+        if workers == 1:
+            counter = _ShardedCounter(directory, options)
+            counter.add_texts(texts)
+            counter.spill()
+            runs = counter.runs
+        else:
+            task_queue = Queue(maxsize=2 * workers)  # bounded, so the input is only read as fast as it's counted
+            result_queue = Queue()
+            processes = [Process(target=_count_worker, args=(task_queue, result_queue, directory, options))
+                         for _ in range(workers)]
+            for process in processes:
+                process.start()
+            done = False
+            try:
+                for batch in batches(texts, None, 1 << 20):
+                    _put_task(task_queue, batch, processes)
+                for _ in processes:
+                    _put_task(task_queue, None, processes)
+                runs = []
+                for _ in processes:
+                    runs.extend(_get_result(result_queue, processes))
+                done = True
+            finally:
+                if not done:
+                    task_queue.cancel_join_thread()  # don't block at exit flushing batches that nobody will read
+                for process in processes:
+                    if not done:
+                        process.terminate()
+                    process.join()
+
+        # reduce: merge each shard's runs
+        shard_runs = [[path for shard, path in runs if shard == shard_idx] for shard_idx in range(options['shards'])]
+        merge_args = [(paths, directory, shard) for shard, paths in enumerate(shard_runs)]
+        if workers == 1:
+            shard_paths = list(map(_merge_shard, merge_args))
+        else:
+            # unlike a Pool, this raises BrokenProcessPool instead of hanging if a worker is killed
+            with ProcessPoolExecutor(min(workers, options['shards'])) as executor:
+                shard_paths = list(executor.map(_merge_shard, merge_args))
+
+        # shards have no keys in common, so this just interleaves them
+        with open(output_path, 'w', encoding=_ENCODING, errors=_ERRORS, newline='\n') as f:
+            f.writelines(f'{key}\t{count}\n' for key, count in heapq.merge(*map(_read_run, shard_paths)))
+
+    return output_path
+
+
+def read_n_gram_counts(path: str) -> Generator[Tuple[Tuple[str, ...], int], Any, None]:
+    """
+    stream (n-gram, count) pairs from a file written by `count_n_grams`, in sorted order
+    """
+    for key, count in _read_run(path):
+        yield tuple(key.split('\t')), count
@@ -0,0 +1,188 @@
+from functools import lru_cache
+from functools import partial
+from operator import methodcaller
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Tuple
+from typing import Union
+
+import unicodedata
+
+_NORMAL_FORMS = {'NFC', 'NFD', 'NFKC', 'NFKD'}
+
+# codepoint -> replacement (or None to delete), like the tables `str.translate` takes
+Table = Dict[int, Optional[str]]
+
+Step = Union[str, Tuple[str, Any]]
+
+# placeholders for steps that are faster as a method call, unless they can be merged into a neighbouring table
+_LOWER = object()
+_CASEFOLD = object()
+
+
+@lru_cache(maxsize=None)
+def _casefold_table() -> Table:
+    # `str.casefold` has no context-dependent rules (unlike `str.lower` and final sigma), so it works char by char
+    table = dict()
+    for codepoint in range(0x110000):
+        folded = chr(codepoint).casefold()
+        if folded != chr(codepoint):
+            table[codepoint] = folded
+    return table
+
+
+@lru_cache(maxsize=None)
+def _lower_table() -> Table:
+    # `str.lower` works char by char except for a capital sigma, which becomes a final sigma at the end of a word
+    # so this table is only correct if the next step maps both sigmas to the same thing
+    table = dict()
+    for codepoint in range(0x110000):
+        lowered = chr(codepoint).lower()
+        if lowered != chr(codepoint):
+            table[codepoint] = lowered
+    return table
+
+
+def _merges_sigmas(table: Table) -> bool:
+    return table.get(ord('σ'), 'σ') == table.get(ord('ς'), 'ς')
+
+
+@lru_cache(maxsize=None)
+def _strip_combining_table() -> Table:
+    # imported here since importing the tokenizer is slower than everything else this module needs
+    from tokenizer import text_combining_codepoints
+    return dict.fromkeys(text_combining_codepoints())
+
+
+def _as_table(table: Dict[int, Union[str, int, None]]) -> Table:
+    out = dict()
+    for codepoint, value in table.items():
+        if isinstance(value, int):
+            value = chr(value)
+        if value != chr(codepoint):
+            out[codepoint] = value
+    return out
+
+
+def _compose_tables(first: Table, second: Table) -> Table:
+    """
+    a single table that does the same as translating with `first` and then with `second`
+    """
+    composed = {codepoint: value for codepoint, value in second.items() if codepoint not in first}
+    for codepoint, value in first.items():
+        if value is not None:
+            value = value.translate(second)
+        if value != chr(codepoint):
+            composed[codepoint] = value
+    return composed
+
+
+class NormalizationPlan:
+    """
+    an ordered list of normalization steps, compiled into as few passes over the text as possible
+    consecutive char-by-char steps (single-char replacements, translation tables, casefolding and stripping combining
+    chars) are merged into a single translation table, so e.g. ten replacements and a translate are a single pass
+    lowercasing is merged too, but only if the next step maps both sigmas ('σ' and 'ς') to the same thing
+
+    steps are applied in order, and each one is one of:
+    * 'NFC', 'NFD', 'NFKC', 'NFKD': unicode normalization
+    * 'casefold' or 'lower'
+    * 'strip_combining': remove combining chars (diacritics, see `is_text_combining_char`)
+    * ('replace', {old: new, ...}): like calling `str.replace` for each item in order
+    * ('translate', table): like `str.translate`
+    """
+
+    def __init__(self, steps: Iterable[Step]):
+        """
+        :param steps: normalization steps, see above
+        """
+        self.steps: List[Step] = list(steps)
+        self._passes: List[Callable[[str], str]] = []
+
+        char_steps = list(self._char_steps())
+
+        # building these tables takes a while, so only do it if there's another table to merge them with
+        # (casefolding maps both sigmas to the same thing, so lowercasing can always be merged into it)
+        for idx, step in enumerate(char_steps):
+            if step is _LOWER:
+                next_step = char_steps[idx + 1] if idx + 1 < len(char_steps) else None
+                if next_step is _CASEFOLD or isinstance(next_step, dict) and _merges_sigmas(next_step):
+                    char_steps[idx] = _lower_table()
+                else:
+                    char_steps[idx] = str.lower
+        for idx, step in enumerate(char_steps):
+            if step is _CASEFOLD:
+                neighbours = char_steps[max(idx - 1, 0):idx] + char_steps[idx + 1:idx + 2]
+                if any(isinstance(neighbour, dict) or neighbour is _CASEFOLD for neighbour in neighbours):
+                    char_steps[idx] = _casefold_table()
+                else:
+                    char_steps[idx] = str.casefold
+
+        table: Optional[Table] = None  # char-by-char steps waiting to be merged
+        for step in char_steps:
+            if isinstance(step, dict):
+                table = step if table is None else _compose_tables(table, step)
+                continue
+
+            if table is not None:
+                self._add_table_pass(table)
+                table = None
+            self._passes.append(step)
+
+        if table is not None:
+            self._add_table_pass(table)
+
+    def _char_steps(self) -> Iterable[Union[Table, Callable[[str], str], object]]:
+        # each step as either a translation table or a function that needs its own pass
+        previous = None
+        for step in self.steps:
+            name, arg = (step, None) if isinstance(step, str) else step
+            if name in _NORMAL_FORMS:
+                if name != previous:  # normalizing twice in a row does nothing
+                    yield partial(unicodedata.normalize, name)
+            elif name == 'casefold':
+                yield _CASEFOLD
+            elif name == 'lower':
+                yield _LOWER
+            elif name == 'strip_combining':
+                yield _strip_combining_table()
+            elif name == 'replace':
+                for old, new in arg.items():
+                    assert old
+                    if len(old) == 1:
+                        yield {ord(old): new} if old != new else {}
+                    else:
+                        yield methodcaller('replace', old, new)
+            elif name == 'translate':
+                yield _as_table(arg)
+            else:
+                raise ValueError(f'unknown normalization step: {step!r}')
+            previous = name
+
+    def _add_table_pass(self, table: Table):
+        if table:
+            self._passes.append(methodcaller('translate', table))
+
+    def __len__(self) -> int:
+        """
+        number of passes over the text
+        """
+        return len(self._passes)
+
+    def apply(self, text: str) -> str:
+        for normalize in self._passes:
+            text = normalize(text)
+        return text
+
+    def apply_batch(self, texts: Iterable[str]) -> List[str]:
+        """
+        same as `[plan.apply(text) for text in texts]`, but runs each pass over the whole batch at once
+        """
+        texts = list(texts)
+        for normalize in self._passes:
+            texts = list(map(normalize, texts))
+        return texts
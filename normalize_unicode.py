@@ -1,21 +1,73 @@
+import codecs
 import json
+import re
 import string
 import warnings
 from collections import Counter
 from functools import lru_cache
+from functools import partial
+from importlib.metadata import PackageNotFoundError
+from importlib.metadata import version
+from itertools import chain
+from typing import Any
+from typing import BinaryIO
 from typing import Dict
+from typing import Generator
+from typing import Iterable
 from typing import List
+from typing import Optional
+from typing import Union
 
 import ftfy as ftfy
 import unicodedata
 import unidecode
 # noinspection PyUnresolvedReferences
 from bs4 import UnicodeDammit
+from bs4.dammit import EncodingDetector
+from ftfy.badness import BADNESS_RE
+from ftfy.chardata import C1_CONTROL_RE
+from ftfy.chardata import CONTROL_CHARS
+from ftfy.chardata import DOUBLE_QUOTE_RE
+from ftfy.chardata import LIGATURES
+from ftfy.chardata import SINGLE_QUOTE_RE
+from ftfy.chardata import WIDTH_MAP
+
+from disk_cache import cache_path
+from disk_cache import read_cache_file
+from disk_cache import write_cache_file
+from normalization import NormalizationPlan
+
+# any of these chars means some ftfy fixer might change the text (html entities, ligatures, fullwidth chars,
+# curly quotes, line breaks, surrogates, terminal escapes, control chars), built from ftfy's own tables
+_RE_FTFY_TRIGGER = re.compile('[' + re.escape(''.join(map(chr, {*CONTROL_CHARS, *LIGATURES, *WIDTH_MAP}))) +
+                              '&\r\u0085\u2028\u2029\ud800-\udfff' +
+                              C1_CONTROL_RE.pattern[1:-1] +
+                              SINGLE_QUOTE_RE.pattern[1:-1] +
+                              DOUBLE_QUOTE_RE.pattern[1:-1] + ']')
+
+# ftfy checks each line separately for mojibake, so `^` must also match at the start of every line
+_RE_FTFY_BADNESS = re.compile(BADNESS_RE.pattern, BADNESS_RE.flags | re.MULTILINE)
+_FTFY_MAX_DECODE_LENGTH = ftfy.TextFixerConfig().max_decode_length
+
+# how often each stage of `fix_unicode` ran or was skipped
+fix_unicode_stats = Counter()
+
+
+def _needs_ftfy(text: str) -> bool:
+    if _RE_FTFY_TRIGGER.search(text) is not None:
+        return True
+    if text.isascii():
+        return False
+    # ftfy also NFC-normalizes, and fixes mojibake (which it only looks for in lines that are flagged as bad)
+    return (len(text) > _FTFY_MAX_DECODE_LENGTH or
+            not unicodedata.is_normalized('NFC', text) or
+            _RE_FTFY_BADNESS.search(text) is not None)
 
 
 def fix_unicode(text: str) -> str:
     """
     Fix unicode text
+    each stage only runs if a cheap check says it might change the text, see `fix_unicode_stats`
 
     :param text:
     :return:
@@ -25,30 +77,130 @@ def fix_unicode(text: str) -> str:
     if isinstance(text, (bytes, bytearray)):
         text = UnicodeDammit.detwingle(text)
 
-    # unexpected type, just coerce
-    elif not isinstance(text, str):
-        text = str(text)
+        # convert to unicode
+        fix_unicode_stats['decode'] += 1
+        text = UnicodeDammit(text).unicode_markup
 
-    # convert to unicode
-    text = UnicodeDammit(text).unicode_markup
+    # UnicodeDammit returns a str unchanged, so there's nothing to decode
+    else:
+        fix_unicode_stats['decode_skipped'] += 1
 
+        # unexpected type, just coerce
+        if not isinstance(text, str):
+            text = str(text)
+
+    return _fix_decoded(text)
+
+
+def _fix_decoded(text: str, unescape_html: Union[bool, str] = 'auto') -> str:
     # ftfy for good measure
-    text = ftfy.fix_text(text)
+    if text is None or _needs_ftfy(text):
+        fix_unicode_stats['ftfy'] += 1
+        text = ftfy.fix_text(text, unescape_html=unescape_html)
+    else:
+        fix_unicode_stats['ftfy_skipped'] += 1
 
     # todo: set flags for suggested encoding, fixing quotation marks, etc
-    text = UnicodeDammit(text,
-                         smart_quotes_to='ascii',
-                         # user_encodings=['utf8', 'utf16'],
-                         ).unicode_markup
+    # note that UnicodeDammit(text, smart_quotes_to='ascii') was a no-op here, it only replaces smart quotes in bytes
 
+    if unicodedata.is_normalized('NFKD', text):
+        fix_unicode_stats['nfkd_skipped'] += 1
+        return text
+    fix_unicode_stats['nfkd'] += 1
     return unicodedata.normalize('NFKD', text)
 
 
-@lru_cache
-def get_ascii_alike_chars() -> Dict[int, str]:
+def _utf8_cut(data: bytes) -> int:
+    # index before the last utf-8 sequence (which may be incomplete), or len(data) if it ends with an ascii byte
+    cut = len(data)
+    while cut > 0 and len(data) - cut < 3 and 0x80 <= data[cut - 1] < 0xC0:
+        cut -= 1
+    if cut > 0 and data[cut - 1] >= 0x80:
+        cut -= 1
+    return cut
+
+
+def fix_unicode_stream(chunks: Union[Iterable[bytes], BinaryIO],
+                       chunk_size: int = 1 << 20,
+                       sniff_size: int = 1 << 16,
+                       ) -> Generator[str, Any, None]:
     """
-    Return a string of characters that look like ASCII
+    like fix_unicode, but for an iterable of byte chunks (or a binary file object) that may not fit in memory
+    the encoding is sniffed from the first `sniff_size` bytes, and then everything is decoded with an incremental
+    decoder (replacing undecodable bytes), so chars split across chunks are fine
+    each yielded str is a run of whole lines (ftfy fixes text line by line anyway), unless a line is longer than
+    `chunk_size`, and can be passed straight to `unicode_tokenize_stream` or `sentence_split_stream`
+
+    :param chunks: iterable of bytes, or a file object opened in binary mode
+    :param chunk_size: bytes to read from a file object at a time, and max chars to hold back waiting for a newline
+    :param sniff_size: bytes to look at to guess the encoding
     """
+    if hasattr(chunks, 'read'):
+        chunks = iter(partial(chunks.read, chunk_size), b'')
+    else:
+        chunks = iter(chunks)
+
+    window = b''
+    for chunk in chunks:
+        window += chunk
+        if len(window) >= sniff_size:
+            break
+
+    # a byte order mark settles it, otherwise sniff whole lines, since a truncated utf-8 char looks like cp1252
+    encoding = EncodingDetector.strip_byte_order_mark(window)[1]
+    if encoding is None:
+        sample = window[:window.rfind(b'\n', 0, sniff_size) + 1] or window[:_utf8_cut(window[:sniff_size])] or window
+        encoding = UnicodeDammit(UnicodeDammit.detwingle(sample)).original_encoding
+    if encoding is None or encoding == 'ascii':
+        encoding = 'utf8'  # any ascii-compatible encoding will do, this one can decode the rest
+    fix_unicode_stats['decode'] += 1
+    decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+
+    # detwingling only makes sense for utf-8 (and would mangle e.g. utf-16)
+    if codecs.lookup(encoding).name == 'utf-8':
+        detwingle = UnicodeDammit.detwingle
+    else:
+        detwingle = bytes
+
+    pending_bytes = b''
+    pending_text = ''
+    unescape_html = 'auto'  # ftfy stops unescaping html entities after the first line with a '<'
+    for chunk in chain([window], chunks):
+        # detwingle whole utf-8 chars only
+        pending_bytes += chunk
+        cut = _utf8_cut(pending_bytes)
+        data = pending_bytes[:cut]
+        pending_bytes = pending_bytes[cut:]
+        pending_text += decoder.decode(data if data.isascii() else detwingle(data))
+
+        # fix and normalize whole lines only (a line break is never part of a mojibake sequence or a combining mark)
+        cut = pending_text.rfind('\n') + 1
+        if not cut and len(pending_text) >= chunk_size:
+            cut = pending_text.rfind(' ') + 1 or len(pending_text)
+        if cut:
+            text = pending_text[:cut]
+            pending_text = pending_text[cut:]
+            fixed = _fix_decoded(text, unescape_html)
+            if fixed:
+                yield fixed
+            if '<' in text:
+                unescape_html = False
+
+    data = pending_bytes if pending_bytes.isascii() else detwingle(pending_bytes)
+    pending_text += decoder.decode(data, final=True)
+    fixed = _fix_decoded(pending_text, unescape_html)
+    if fixed:
+        yield fixed
+
+
+def _unidecode_version() -> str:
+    try:
+        return version('unidecode')
+    except PackageNotFoundError:
+        return getattr(unidecode, '__version__', 'unknown')
+
+
+def _build_ascii_alike_chars() -> Dict[int, str]:
     alpha_alike_codepoints = dict()
     for char in string.ascii_letters + string.digits:
         alpha_alike_codepoints[char] = []
@@ -56,7 +208,6 @@ def get_ascii_alike_chars() -> Dict[int, str]:
     with warnings.catch_warnings():
         warnings.simplefilter('ignore')
 
-        c = Counter()
         for codepoint in range(0x10FFFF):
             char = chr(codepoint)
 
@@ -111,44 +262,83 @@ def get_ascii_alike_chars() -> Dict[int, str]:
                      'ETHIOPIC' not in unicodedata.name(char))):
                 alpha_alike_codepoints[alpha].append(codepoint)
                 # print(chr(codepoint), f'U+{codepoint:04x}', unicodedata.name(char))
-            else:
-                c.update(unicodedata.name(char).split())
-                print(char, unicodedata.name(char), alpha)
 
-    # print(c.most_common(100))
     # print({chr(codepoint): char for char, codepoints in alpha_alike_codepoints.items() for codepoint in codepoints})
     return {codepoint: char for char, codepoints in alpha_alike_codepoints.items() for codepoint in codepoints}
 
 
+def _load_ascii_alike_chars(path: str, versions: Dict[str, str]) -> Optional[Dict[int, str]]:
+    data = read_cache_file(path)
+    if data is None:
+        return None
+    try:
+        cached = json.loads(data.decode('utf8'))
+    except ValueError:
+        return None
+    if cached.get('versions') != versions:
+        return None
+    return {ord(char): alpha for alpha, chars in cached['chars'].items() for char in chars}
+
+
+def _save_ascii_alike_chars(path: str, versions: Dict[str, str], ascii_alike_chars: Dict[int, str]):
+    chars = dict()
+    for codepoint, alpha in ascii_alike_chars.items():
+        chars[alpha] = chars.get(alpha, '') + chr(codepoint)
+    write_cache_file(path, json.dumps({'versions': versions, 'chars': chars}, ensure_ascii=False).encode('utf8'))
+
+
+@lru_cache
+def get_ascii_alike_chars() -> Dict[int, str]:
+    """
+    Return a string of characters that look like ASCII
+    generated once and cached on disk, keyed by the unicode database version and the unidecode version
+    """
+    versions = {'unidata': unicodedata.unidata_version, 'unidecode': _unidecode_version()}
+    path = cache_path(f'ascii_alike_chars-{versions["unidata"]}-{versions["unidecode"]}.json')
+
+    ascii_alike_chars = _load_ascii_alike_chars(path, versions)
+    if ascii_alike_chars is None:
+        ascii_alike_chars = _build_ascii_alike_chars()
+        _save_ascii_alike_chars(path, versions, ascii_alike_chars)
+    return ascii_alike_chars
+
+
+@lru_cache
+def _normalize_unicode_plan() -> NormalizationPlan:
+    # all single-char replacements, so this is merged with the ascii-alike chars into one translation table
+    return NormalizationPlan([
+        ('replace', {
+            # copilot suggested this
+            u'\u2013': '-',
+            u'\u2014': '-',
+            u'\u2018': "'",
+            u'\u2019': "'",
+            u'\u201a': ',',
+            u'\u201b': '"',
+            u'\u201c': '"',
+            u'\u201d': '"',
+            u'\u201e': '"',
+            u'\u201f': '"',
+            u'\u2022': '*',
+            u'\u2026': '...',
+            u'\u00a0': ' ',
+            u'\u20ac': '€',
+
+            # zero-width stuff
+            u'\u200b': '',
+            u'\u200c': '',
+            u'\u200d': '',
+            u'\ufeff': '',
+        }),
+        ('translate', get_ascii_alike_chars()),
+    ])
+
+
 def normalize_unicode(text: str) -> str:
     """
     normalize unicode characters that to ASCII characters
     """
-    text = fix_unicode(text)
-
-    # copilot suggested this
-    text = text.replace(u'\u2013', '-')
-    text = text.replace(u'\u2014', '-')
-    text = text.replace(u'\u2018', "'")
-    text = text.replace(u'\u2019', "'")
-    text = text.replace(u'\u201a', ',')
-    text = text.replace(u'\u201b', '"')
-    text = text.replace(u'\u201c', '"')
-    text = text.replace(u'\u201d', '"')
-    text = text.replace(u'\u201e', '"')
-    text = text.replace(u'\u201f', '"')
-    text = text.replace(u'\u2022', '*')
-    text = text.replace(u'\u2026', '...')
-    text = text.replace(u'\u00a0', ' ')
-    text = text.replace(u'\u20ac', '€')
-
-    # zero-width stuff
-    text = text.replace(u'\u200b', '')
-    text = text.replace(u'\u200c', '')
-    text = text.replace(u'\u200d', '')
-    text = text.replace(u'\ufeff', '')
-
-    return text.translate(get_ascii_alike_chars())
+    return _normalize_unicode_plan().apply(fix_unicode(text))
 
 
 if __name__ == '__main__':
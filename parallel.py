@@ -0,0 +1,224 @@
+import mmap
+import os
+import re
+from collections import deque
+from collections import namedtuple
+from itertools import starmap
+from multiprocessing import Pool
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import Generator
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Pattern
+from typing import Tuple
+
+import numpy as np
+
+from batching import batches
+from tokenizer import TokenArray
+from tokenizer import unicode_tokenize_spans
+from tokenizer import word_n_grams
+
+# absolute offsets of all tokens in one chunk of a file, as numpy arrays
+# slice a token out of the (memory-mapped) file with `mm[byte_start:byte_end].decode('utf8')`
+ChunkTokens = namedtuple('ChunkTokens', ['starts', 'ends', 'byte_starts', 'byte_ends', 'categories'])
+
+# ascii whitespace never appears inside a multi-byte utf-8 sequence, and is always a token by itself
+_RE_ASCII_WHITESPACE: Pattern = re.compile(rb'[\t\n\x0b\x0c\r ]')
+
+
+def _chunk_boundaries(mm: mmap.mmap, chunk_bytes: int) -> List[Tuple[int, int]]:
+    """
+    split a file into (start, end) byte ranges of roughly chunk_bytes, ending just after an ascii whitespace byte
+    a chunk may be larger than chunk_bytes if there is no whitespace in the way (e.g. a huge base64 blob)
+    """
+    boundaries = []
+    start = 0
+    while start < len(mm):
+        # prefer to break at a newline, but settle for any whitespace
+        end = mm.find(b'\n', start + chunk_bytes, start + 2 * chunk_bytes)
+        if end < 0:
+            match = _RE_ASCII_WHITESPACE.search(mm, start + chunk_bytes)
+            end = match.start() if match else len(mm) - 1
+        end = min(end + 1, len(mm))
+        boundaries.append((start, end))
+        start = end
+    return boundaries
+
+
+def _imap_bounded(pool: Pool,
+                  func: Callable[..., Any],
+                  tasks: Iterable[Tuple[Any, ...]],
+                  max_pending: int,
+                  ) -> Generator[Tuple[Tuple[Any, ...], Any], Any, None]:
+    """
+    yield (args, func(*args)) in input order, with at most max_pending tasks in flight
+    unlike `Pool.imap`, this won't read the whole input into memory if the workers can't keep up,
+    and won't pile up unread results if the caller can't keep up
+    """
+    pending = deque()
+    for args in tasks:
+        pending.append((args, pool.apply_async(func, args)))
+        if len(pending) >= max_pending:
+            args, result = pending.popleft()
+            yield args, result.get()
+    while pending:
+        args, result = pending.popleft()
+        yield args, result.get()
+
+
+def _tokenize_file_chunk(path: str,
+                         byte_start: int,
+                         byte_end: int,
+                         words_only: bool,
+                         merge_apostrophe_word: bool,
+                         ) -> Tuple[int, Tuple[np.ndarray, ...]]:
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        # invalid utf-8 becomes lone surrogates, so each invalid byte is one char and re-encodes to itself
+        text = mm[byte_start:byte_end].decode('utf8', errors='surrogateescape')
+
+    starts, ends, categories = unicode_tokenize_spans(text, words_only, merge_apostrophe_word)
+
+    # byte offset of every char (and the end), from the utf-8 length of each codepoint
+    if text.isascii():
+        byte_starts, byte_ends = starts, ends
+    else:
+        codepoints = np.frombuffer(text.encode('utf-32-le', 'surrogatepass'), dtype='<u4')
+        utf8_lengths = (1 + (codepoints >= 0x80).astype(np.int64) + (codepoints >= 0x800) + (codepoints >= 0x10000))
+        utf8_lengths[(codepoints >= 0xDC80) & (codepoints <= 0xDCFF)] = 1  # surrogate-escaped bytes
+        byte_offsets = np.concatenate(([0], np.cumsum(utf8_lengths)))
+        byte_starts, byte_ends = byte_offsets[starts], byte_offsets[ends]
+
+    # offsets within the chunk fit in 32 bits (unless there was no whitespace to split at for 4GB),
+    # which halves what has to be sent back to the parent process
+    offset_dtype = np.uint32 if byte_end - byte_start < 1 << 32 else np.int64
+    offsets = tuple(offsets.astype(offset_dtype) for offsets in (starts, ends, byte_starts, byte_ends))
+    return len(text), offsets + (categories,)
+
+
+def tokenize_file(path: str,
+                  workers: Optional[int] = None,
+                  chunk_bytes: int = 1 << 24,
+                  words_only: bool = False,
+                  merge_apostrophe_word: bool = False,
+                  ) -> Generator[ChunkTokens, Any, None]:
+    """
+    tokenize a large utf-8 file across a process pool
+    the file is memory-mapped and split into chunks at ascii whitespace, and each worker tokenizes its own chunk
+    yields one ChunkTokens per chunk, in file order, with both char offsets and byte offsets relative to the file
+    tokens are the same as `unicode_tokenize(text, as_tokens=True)` of the whole file
+    only a few chunks are tokenized ahead of the caller, so memory use doesn't grow with the size of the file
+
+    :param path: to a utf-8 text file (invalid bytes are counted as one char each)
+    :param workers: number of processes, defaults to the cpu count (use 1 to tokenize in this process)
+    :param chunk_bytes: approximate size of each chunk
+    :param words_only: whether or not to return punctuation/symbols/unprintable/whitespace
+    :param merge_apostrophe_word: e.g. "isn't" and "l'ensemble", see `unicode_tokenize`
+    """
+    if os.path.getsize(path) == 0:
+        return  # can't mmap an empty file
+
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        boundaries = _chunk_boundaries(mm, chunk_bytes)
+    tasks = [(path, byte_start, byte_end, words_only, merge_apostrophe_word) for byte_start, byte_end in boundaries]
+
+    def _results():
+        if workers == 1:
+            yield from starmap(_tokenize_file_chunk, tasks)
+        else:
+            with Pool(workers) as pool:
+                for _, result in _imap_bounded(pool, _tokenize_file_chunk, tasks, 2 * (workers or os.cpu_count() or 1)):
+                    yield result
+
+    char_offset = 0
+    for (byte_offset, _), (n_chars, (starts, ends, byte_starts, byte_ends, categories)) in zip(boundaries, _results()):
+        yield ChunkTokens(starts.astype(np.int64) + char_offset,
+                          ends.astype(np.int64) + char_offset,
+                          byte_starts.astype(np.int64) + byte_offset,
+                          byte_ends.astype(np.int64) + byte_offset,
+                          categories)
+        char_offset += n_chars
+
+
+def _tokenize_batch(texts: List[str], options: Dict[str, Any]) -> List[Tuple[Any, Any, bytes]]:
+    # only send back the offsets, the parent process already has the text
+    results = []
+    for text in texts:
+        tokens = TokenArray.from_text(text, engine='numpy', **options)
+        results.append((tokens.starts, tokens.ends, tokens.categories))
+    return results
+
+
+def _word_n_grams_batch(texts: List[str], options: Dict[str, Any]) -> List[List[Tuple[str, ...]]]:
+    return [list(word_n_grams(text, **options)) for text in texts]
+
+
+def _map_batches(func: Callable[[List[str], Dict[str, Any]], List[Any]],
+                 texts: Iterable[str],
+                 options: Dict[str, Any],
+                 workers: Optional[int],
+                 chunksize: Optional[int],
+                 batch_chars: int = 1 << 18,
+                 ) -> Generator[Tuple[str, Any], Any, None]:
+    """
+    yield (text, func result) in input order, with a bounded number of batches in flight
+    """
+    if workers == 1:
+        for batch in batches(texts, chunksize, batch_chars):
+            yield from zip(batch, func(batch, options))
+        return
+
+    with Pool(workers) as pool:
+        tasks = ((batch, options) for batch in batches(texts, chunksize, batch_chars))
+        for (batch, _), results in _imap_bounded(pool, func, tasks, 4 * (workers or os.cpu_count() or 1)):
+            yield from zip(batch, results)
+
+
+def unicode_tokenize_batch(texts: Iterable[str],
+                           workers: Optional[int] = None,
+                           chunksize: Optional[int] = None,
+                           words_only: bool = False,
+                           merge_apostrophe_word: bool = False,
+                           merge_whitespace: bool = False,
+                           ) -> Generator[TokenArray, Any, None]:
+    """
+    tokenize many texts across a process pool, yielding a TokenArray for each text in input order
+    workers only send back token offsets (not strings or Token objects), which are attached to the original text
+
+    :param texts: iterable of str, consumed lazily
+    :param workers: number of processes, defaults to the cpu count (use 1 to tokenize in this process)
+    :param chunksize: texts per task, defaults to batching by total length (about 256k chars per task)
+    :param words_only: whether or not to return punctuation/symbols/unprintable/whitespace
+    :param merge_apostrophe_word: e.g. "isn't" and "l'ensemble", see `unicode_tokenize`
+    :param merge_whitespace: one WHITESPACE token per run of whitespace, see `unicode_tokenize`
+    """
+    options = {'words_only': words_only,
+               'merge_apostrophe_word': merge_apostrophe_word,
+               'merge_whitespace': merge_whitespace}
+    for text, (starts, ends, categories) in _map_batches(_tokenize_batch, texts, options, workers, chunksize):
+        yield TokenArray(text, starts, ends, categories)
+
+
+def word_n_grams_batch(texts: Iterable[str],
+                       n: int = 2,
+                       split_sentences: bool = True,
+                       merge_apostrophe_word: bool = False,
+                       workers: Optional[int] = None,
+                       chunksize: Optional[int] = None,
+                       ) -> Generator[List[Tuple[str, ...]], Any, None]:
+    """
+    word_n_grams for many texts across a process pool, yielding a list of n-grams for each text in input order
+
+    :param texts: iterable of str, consumed lazily
+    :param n: how long is the n-gram
+    :param split_sentences: don't allow n-grams to span sentences
+    :param merge_apostrophe_word: see tokenize function
+    :param workers: number of processes, defaults to the cpu count (use 1 to run in this process)
+    :param chunksize: texts per task, defaults to batching by total length (about 256k chars per task)
+    """
+    options = {'n': n, 'split_sentences': split_sentences, 'merge_apostrophe_word': merge_apostrophe_word}
+    for _, n_grams in _map_batches(_word_n_grams_batch, texts, options, workers, chunksize):
+        yield n_grams
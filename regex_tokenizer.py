@@ -1,11 +1,13 @@
 import json
+from functools import lru_cache
 from typing import Dict
 from typing import List
 from typing import Pattern
 from typing import Union
 
 import regex
-import unicodedata
+
+from normalization import NormalizationPlan
 
 _REGEX_GRAPHEME: Pattern = regex.compile(r'\X', flags=regex.UNICODE)  # builtins.re does not support `\X`
 _REGEX_WORD_CHAR: Pattern = regex.compile(r'\w', flags=regex.UNICODE)
@@ -78,28 +80,35 @@ _ASCII_ALIKE: Dict[str, str] = {
 _ASCII_ALIKE_LOOKUP: Dict[int, str] = {ord(char): alpha for alpha, chars in _ASCII_ALIKE.items() for char in chars}
 
 
-def _preprocess(text: str,
-                nfkd: bool = False,
-                casefold: bool = False,
-                replace_ascii: bool = False,
-                ) -> str:
-    # sanity check
-    if not isinstance(text, str):
-        raise TypeError(f'expected <str>, got <{type(text)}>')
+@lru_cache(maxsize=None)
+def _preprocess_plan(nfkd: bool, casefold: bool, replace_ascii: bool) -> NormalizationPlan:
+    steps = []
 
     # step 1: unicode decomposition
     if nfkd:
-        text = unicodedata.normalize("NFKD", text)
+        steps.append('NFKD')
 
     # step 2: casefold (or lowercase if we're converting to ascii later)
     if casefold:
-        text = text.lower() if replace_ascii else text.casefold()
+        steps.append('lower' if replace_ascii else 'casefold')
 
-    # step 3: replace ascii-like chars
+    # step 3: replace ascii-like chars (which also merges the lowercasing into the same pass)
     if replace_ascii:
-        text = text.translate(_ASCII_ALIKE_LOOKUP)
+        steps.append(('translate', _ASCII_ALIKE_LOOKUP))
+
+    return NormalizationPlan(steps)
+
+
+def _preprocess(text: str,
+                nfkd: bool = False,
+                casefold: bool = False,
+                replace_ascii: bool = False,
+                ) -> str:
+    # sanity check
+    if not isinstance(text, str):
+        raise TypeError(f'expected <str>, got <{type(text)}>')
 
-    return text
+    return _preprocess_plan(nfkd, casefold, replace_ascii).apply(text)
 
 
 def word_tokenize(text: str,
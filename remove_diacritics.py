@@ -1,11 +1,15 @@
-import unicodedata
+from functools import lru_cache
 
-from tokenizer import is_text_combining_char
+from normalization import NormalizationPlan
+
+
+@lru_cache
+def _remove_diacritics_plan() -> NormalizationPlan:
+    return NormalizationPlan(['NFKD', 'strip_combining'])
 
 
 def remove_diacritics(text: str) -> str:
     """
     Remove diacritics or zalgo from a string.
     """
-    return ''.join(char for char in unicodedata.normalize('NFKD', text)
-                   if not is_text_combining_char(char))
+    return _remove_diacritics_plan().apply(text)
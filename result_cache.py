@@ -0,0 +1,225 @@
+import sqlite3
+import sys
+import time
+from array import array
+from collections import Counter
+from collections import OrderedDict
+from hashlib import blake2b
+from typing import Callable
+from typing import Optional
+
+from normalize_unicode import normalize_unicode
+from remove_html_tags import remove_html_tags
+from tokenizer import TokenArray
+
+# rough bookkeeping cost of each in-process entry (the ordered dict slot and the key and value objects)
+_ENTRY_OVERHEAD = 128
+
+# rows are evicted from the shared store this many at a time, oldest first
+_EVICT_BATCH_SIZE = 64
+
+# a shared hit only updates the row's last-used time if it's older than this, since every update is a write
+# transaction (which would make concurrent readers take turns), and eviction order doesn't need to be that precise
+_TOUCH_INTERVAL_NS = 60 * 10 ** 9
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS results (key BLOB PRIMARY KEY, value BLOB NOT NULL, used INTEGER NOT NULL) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS results_used ON results (used);
+CREATE TABLE IF NOT EXISTS total_size (id INTEGER PRIMARY KEY CHECK (id = 0), bytes INTEGER NOT NULL);
+INSERT OR IGNORE INTO total_size VALUES (0, 0);
+'''
+
+
+def _encode_token_array(tokens: TokenArray) -> bytes:
+    # token count, then the starts, ends and categories, so 9 bytes per token
+    starts = tokens.starts
+    ends = tokens.ends
+    if sys.byteorder != 'little':
+        starts = array('I', starts)
+        starts.byteswap()
+        ends = array('I', ends)
+        ends.byteswap()
+    return len(tokens).to_bytes(4, 'little') + starts.tobytes() + ends.tobytes() + bytes(tokens.categories)
+
+
+def _decode_token_array(text: str, value: bytes) -> TokenArray:
+    size = int.from_bytes(value[:4], 'little')
+    starts = array('I', value[4:4 + 4 * size])
+    ends = array('I', value[4 + 4 * size:4 + 8 * size])
+    if sys.byteorder != 'little':
+        starts.byteswap()
+        ends.byteswap()
+    return TokenArray(text, starts, ends, value[4 + 8 * size:])
+
+
+class ResultCache:
+    """
+    opt-in cache for the results of normalizing or tokenizing the same texts over and over (e.g. message templates)
+    keyed by a blake2b hash of the function, its options, and the text, so the text itself is never stored
+    results are stored as compact bytes (e.g. 9 bytes of offsets per token), and evicted least-recently-used first
+    once they take up more than `max_bytes`
+
+    with a `path`, results are also shared between processes through a sqlite file (with its own size limit)
+    sqlite connections can't be shared across a fork, so create a separate `ResultCache` in each worker process
+    """
+
+    def __init__(self,
+                 max_bytes: int = 64 << 20,
+                 path: Optional[str] = None,
+                 shared_max_bytes: int = 1 << 30,
+                 ):
+        """
+        :param max_bytes: size limit of the in-process cache
+        :param path: sqlite file to share results between processes (created if it doesn't exist)
+        :param shared_max_bytes: size limit of the sqlite file's contents
+        """
+        self.max_bytes = max_bytes
+        self.shared_max_bytes = shared_max_bytes
+        self.stats = Counter()  # hits, misses, evictions, and the same for the shared store
+        self._entries: OrderedDict = OrderedDict()  # key -> value, least recently used first
+        self._size = 0
+
+        self._db: Optional[sqlite3.Connection] = None
+        if path is not None:
+            self._db = sqlite3.connect(path, timeout=60)
+            self._db.execute('PRAGMA journal_mode=WAL')  # readers don't block the writer
+            self._db.execute('PRAGMA synchronous=NORMAL')
+            with self._db:
+                self._db.executescript(_SCHEMA)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def size_bytes(self) -> int:
+        return self._size
+
+    @staticmethod
+    def key(name: str, text: str, options: str = '') -> bytes:
+        """
+        :param name: of the function
+        :param text: input text
+        :param options: the function's options, formatted as a string
+        """
+        key_hash = blake2b(f'{name}({options})'.encode('utf8'), digest_size=16)
+        key_hash.update(b'\0')  # can't appear in the name or options, so the text can't be confused with them
+        key_hash.update(text.encode('utf8', 'surrogatepass'))
+        return key_hash.digest()
+
+    def get(self, key: bytes) -> Optional[bytes]:
+        value = self._entries.get(key)
+        if value is not None:
+            self._entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return value
+
+        if self._db is not None:
+            row = self._db.execute('SELECT value, used FROM results WHERE key = ?', (key,)).fetchone()
+            if row is not None:
+                value, used = row
+                now = time.time_ns()
+                if now - used > _TOUCH_INTERVAL_NS:
+                    with self._db:
+                        self._db.execute('UPDATE results SET used = ? WHERE key = ?', (now, key))
+                self.stats['shared_hits'] += 1
+                self._put_local(key, value)
+                return value
+            self.stats['shared_misses'] += 1
+
+        self.stats['misses'] += 1
+        return None
+
+    def put(self, key: bytes, value: bytes):
+        self._put_local(key, value)
+        if self._db is not None:
+            self._put_shared(key, value)
+
+    def _put_local(self, key: bytes, value: bytes):
+        size = len(key) + len(value) + _ENTRY_OVERHEAD
+        if size > self.max_bytes:
+            return
+        old_value = self._entries.pop(key, None)
+        if old_value is not None:
+            self._size -= len(key) + len(old_value) + _ENTRY_OVERHEAD
+        self._entries[key] = value
+        self._size += size
+        while self._size > self.max_bytes:
+            old_key, old_value = self._entries.popitem(last=False)
+            self._size -= len(old_key) + len(old_value) + _ENTRY_OVERHEAD
+            self.stats['evictions'] += 1
+
+    def _put_shared(self, key: bytes, value: bytes):
+        size = len(key) + len(value)
+        if size > self.shared_max_bytes:
+            return
+        with self._db:
+            inserted = self._db.execute('INSERT OR IGNORE INTO results VALUES (?, ?, ?)',
+                                        (key, value, time.time_ns())).rowcount
+            if not inserted:
+                return  # another process got there first
+            self._db.execute('UPDATE total_size SET bytes = bytes + ?', (size,))
+
+            total_size = self._db.execute('SELECT bytes FROM total_size').fetchone()[0]
+            while total_size > self.shared_max_bytes:
+                rows = self._db.execute('SELECT key, length(key) + length(value) FROM results ORDER BY used LIMIT ?',
+                                        (_EVICT_BATCH_SIZE,)).fetchall()
+                if not rows:
+                    break
+                for old_key, old_size in rows:
+                    if total_size <= self.shared_max_bytes:
+                        break
+                    self._db.execute('DELETE FROM results WHERE key = ?', (old_key,))
+                    self._db.execute('UPDATE total_size SET bytes = bytes - ?', (old_size,))
+                    total_size -= old_size
+                    self.stats['shared_evictions'] += 1
+
+    def apply(self, func: Callable[..., str], text: str, **options) -> str:
+        """
+        `func(text, **options)`, for any function that returns a str (e.g. `normalize_unicode`)
+        """
+        key = self.key(f'{func.__module__}.{func.__qualname__}', text, repr(sorted(options.items())))
+        value = self.get(key)
+        if value is not None:
+            return value.decode('utf8', 'surrogatepass')
+        result = func(text, **options)
+        self.put(key, result.encode('utf8', 'surrogatepass'))
+        return result
+
+    def normalize_unicode(self, text: str) -> str:
+        return self.apply(normalize_unicode, text)
+
+    def remove_html_tags(self, text: str, replacement: str = ' ') -> str:
+        return self.apply(remove_html_tags, text, replacement=replacement)
+
+    def tokenize(self,
+                 text: str,
+                 words_only: bool = False,
+                 merge_apostrophe_word: bool = False,
+                 merge_whitespace: bool = False,
+                 ) -> TokenArray:
+        """
+        `TokenArray.from_text(text, ...)`, only the offsets and categories are cached, not the token strings
+        """
+        key = self.key('tokenize', text, f'{words_only},{merge_apostrophe_word},{merge_whitespace}')
+        value = self.get(key)
+        if value is not None:
+            return _decode_token_array(text, value)
+        tokens = TokenArray.from_text(text,
+                                      words_only=words_only,
+                                      merge_apostrophe_word=merge_apostrophe_word,
+                                      engine='run',
+                                      merge_whitespace=merge_whitespace)
+        self.put(key, _encode_token_array(tokens))
+        return tokens
+
+    def clear(self):
+        """
+        empty the in-process cache (but not the shared store)
+        """
+        self._entries.clear()
+        self._size = 0
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
@@ -0,0 +1,238 @@
+import json
+import os
+from typing import Any
+from typing import Dict
+from typing import Generator
+from typing import Iterable
+from typing import List
+from typing import Tuple
+
+import numpy as np
+
+from tokenizer import unicode_tokenize
+
+# token id 0 separates documents, so that no phrase can span two documents
+_SEPARATOR = 0
+
+_ARRAY_NAMES = ('ids', 'suffixes', 'lcp', 'starts', 'ends', 'doc_offsets')
+
+
+def _build_suffix_array(ids: np.ndarray) -> Tuple[np.ndarray, List[np.ndarray]]:
+    """
+    prefix doubling: sort suffixes by their first k tokens, then by their first 2k tokens (using the ranks of the
+    two halves as keys), etc, until all ranks are distinct; O(n log^2 n) but every step is vectorized
+    also returns the ranks from every step, where ranks[j][i] orders suffix i by its first 2 ** j tokens
+    """
+    n = len(ids)
+    rank_dtype = np.uint32 if n < 1 << 32 else np.uint64
+    rank = ids.astype(np.int64)
+    ranks = [ids]
+    suffixes = np.argsort(rank, kind='stable')
+    k = 1
+    while n > 1:
+        second = np.full(n, -1, dtype=np.int64)  # suffixes that run out of tokens sort first
+        second[:max(0, n - k)] = rank[k:]
+        suffixes = np.lexsort((second, rank))
+
+        sorted_rank = rank[suffixes]
+        sorted_second = second[suffixes]
+        is_new = np.ones(n, dtype=bool)
+        is_new[1:] = (sorted_rank[1:] != sorted_rank[:-1]) | (sorted_second[1:] != sorted_second[:-1])
+        rank = np.empty(n, dtype=np.int64)
+        rank[suffixes] = np.cumsum(is_new) - 1
+        ranks.append(rank.astype(rank_dtype))
+        if rank[suffixes[-1]] == n - 1:
+            break
+        k *= 2
+    return suffixes, ranks
+
+
+def _build_lcp(ids: np.ndarray, suffixes: np.ndarray, ranks: List[np.ndarray]) -> np.ndarray:
+    """
+    lcp[r] is the length of the common prefix of suffixes[r - 1] and suffixes[r]
+    common prefixes stop at document separators, so they never span two documents
+    binary lifting over the ranks from `_build_suffix_array`: two suffixes share their first 2 ** j tokens iff they
+    have the same rank in step j, so every adjacent pair is extended by 2 ** j tokens at a time, largest first
+    vectorized like the suffix sort, but the ranks from every step are kept until then (4 bytes per token per step)
+    """
+    n = len(ids)
+    previous = suffixes[:-1]
+    current = suffixes[1:]
+    common = np.zeros(len(current), dtype=np.int64)
+    for step in reversed(range(len(ranks))):
+        previous_pos = previous + common
+        current_pos = current + common
+        is_common = (previous_pos < n) & (current_pos < n)
+        is_common[is_common] = ranks[step][previous_pos[is_common]] == ranks[step][current_pos[is_common]]
+        common += is_common.astype(np.int64) << step
+
+    # every document ends with a separator, and the common prefix has it at the same offset in both suffixes
+    separators = np.flatnonzero(ids == _SEPARATOR)
+    common = np.minimum(common, separators[np.searchsorted(separators, previous)] - previous)
+
+    lcp = np.zeros(n, dtype=np.uint32)
+    lcp[1:] = common
+    return lcp
+
+
+class SuffixArray:
+    """
+    suffix array (and lcp array) over the word ids of a tokenized corpus, for counting and locating any phrase
+    a lookup is two binary searches over the sorted suffixes, so it takes O(phrase length * log(corpus length))
+    """
+
+    def __init__(self,
+                 vocabulary: List[str],
+                 casefold: bool,
+                 ids: np.ndarray,
+                 suffixes: np.ndarray,
+                 lcp: np.ndarray,
+                 starts: np.ndarray,
+                 ends: np.ndarray,
+                 doc_offsets: np.ndarray,
+                 ):
+        self.vocabulary = vocabulary  # word of each id, with '' for the separator
+        self.word_ids: Dict[str, int] = {word: word_id for word_id, word in enumerate(vocabulary) if word_id}
+        self.casefold = casefold
+        self.ids = ids  # word id of each token, with a separator after each document
+        self.suffixes = suffixes  # token positions, sorted by the token ids from there on
+        self.lcp = lcp
+        self.starts = starts  # char offsets of each token in its document
+        self.ends = ends
+        self.doc_offsets = doc_offsets  # position of the first token of each document
+
+    def __len__(self) -> int:
+        return len(self.doc_offsets)
+
+    @classmethod
+    def build(cls, texts: Iterable[str], casefold: bool = False) -> 'SuffixArray':
+        """
+        tokenize the texts (keeping words only) and build the suffix and lcp arrays
+
+        :param texts: the documents, referred to by their index
+        :param casefold: make phrases case-insensitive
+        """
+        vocabulary = ['']
+        word_ids = dict()
+        ids = []
+        starts = []
+        ends = []
+        doc_offsets = []
+        for text in texts:
+            doc_offsets.append(len(ids))
+            for token in unicode_tokenize(text, words_only=True, as_tokens=True, engine='run'):
+                word = token.text.casefold() if casefold else token.text
+                word_id = word_ids.get(word)
+                if word_id is None:
+                    word_id = word_ids[word] = len(vocabulary)
+                    vocabulary.append(word)
+                ids.append(word_id)
+                starts.append(token.start_pos)
+                ends.append(token.start_pos + len(token.text))
+            ids.append(_SEPARATOR)
+            starts.append(len(text))
+            ends.append(len(text))
+
+        ids = np.array(ids, dtype=np.uint32)
+        suffixes, ranks = _build_suffix_array(ids)
+        lcp = _build_lcp(ids, suffixes, ranks)
+        del ranks
+        return cls(vocabulary,
+                   casefold,
+                   ids,
+                   suffixes.astype(np.uint32 if len(ids) < 1 << 32 else np.uint64),
+                   lcp,
+                   np.array(starts, dtype=np.uint32),
+                   np.array(ends, dtype=np.uint32),
+                   np.array(doc_offsets, dtype=np.int64))
+
+    def _phrase_ids(self, phrase: str) -> List[int]:
+        words = unicode_tokenize(phrase, words_only=True)
+        return [self.word_ids.get(word.casefold() if self.casefold else word, -1) for word in words]
+
+    def _suffix_range(self, phrase_ids: List[int]) -> Tuple[int, int]:
+        # the suffixes starting with the phrase are contiguous, find the first and the one after the last
+        ids = self.ids
+        suffixes = self.suffixes
+        length = len(phrase_ids)
+
+        low, high = 0, len(suffixes)
+        while low < high:
+            mid = (low + high) // 2
+            suffix = int(suffixes[mid])
+            if ids[suffix:suffix + length].tolist() < phrase_ids:
+                low = mid + 1
+            else:
+                high = mid
+        first = low
+
+        high = len(suffixes)
+        while low < high:
+            mid = (low + high) // 2
+            suffix = int(suffixes[mid])
+            if ids[suffix:suffix + length].tolist() <= phrase_ids:
+                low = mid + 1
+            else:
+                high = mid
+        return first, low
+
+    def count(self, phrase: str) -> int:
+        """
+        number of occurrences of the words of the phrase, in order (across any whitespace/punctuation)
+        """
+        phrase_ids = self._phrase_ids(phrase)
+        if not phrase_ids or -1 in phrase_ids:
+            return 0
+        first, last = self._suffix_range(phrase_ids)
+        return last - first
+
+    def locate(self, phrase: str) -> List[Tuple[int, int, int]]:
+        """
+        every occurrence of the phrase as (document index, start, end), where start and end are char offsets
+        """
+        phrase_ids = self._phrase_ids(phrase)
+        if not phrase_ids or -1 in phrase_ids:
+            return []
+        first, last = self._suffix_range(phrase_ids)
+        positions = np.sort(self.suffixes[first:last].astype(np.int64))
+        doc_idxs = np.searchsorted(self.doc_offsets, positions, side='right') - 1
+        return list(zip(doc_idxs.tolist(),
+                        self.starts[positions].tolist(),
+                        self.ends[positions + len(phrase_ids) - 1].tolist()))
+
+    def repeated_phrases(self, length: int, min_count: int = 2) -> Generator[Tuple[Tuple[str, ...], int], Any, None]:
+        """
+        every phrase of `length` words that occurs at least min_count times, with its count
+        phrases are ordered by word id (i.e. by when each word first appears in the corpus), not alphabetically
+        uses the lcp array, so this is a single vectorized scan
+        """
+        assert length >= 1 and min_count >= 2
+        # a run of consecutive suffixes sharing a prefix of `length` words is a group of occurrences of one phrase
+        is_shared = np.concatenate(([False], self.lcp[1:] >= length, [False]))
+        run_starts = np.flatnonzero(is_shared[1:] & ~is_shared[:-1])  # first suffix of the run
+        run_ends = np.flatnonzero(~is_shared[1:] & is_shared[:-1])  # last suffix of the run
+        for run_start, run_end in zip(run_starts.tolist(), run_ends.tolist()):
+            count = run_end - run_start + 1
+            if count >= min_count:
+                suffix = int(self.suffixes[run_start])
+                yield tuple(self.vocabulary[word_id] for word_id in self.ids[suffix:suffix + length].tolist()), count
+
+    def save(self, directory: str):
+        """
+        write each array to an .npy file (plus the vocabulary as json), see `load`
+        """
+        os.makedirs(directory, exist_ok=True)
+        for name in _ARRAY_NAMES:
+            np.save(os.path.join(directory, f'{name}.npy'), getattr(self, name))
+        with open(os.path.join(directory, 'vocabulary.json'), 'w', encoding='utf8') as f:
+            json.dump({'casefold': self.casefold, 'vocabulary': self.vocabulary}, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, directory: str) -> 'SuffixArray':
+        """
+        memory-map the arrays written by `save`, so only the parts touched by a lookup are read from disk
+        """
+        with open(os.path.join(directory, 'vocabulary.json'), encoding='utf8') as f:
+            metadata = json.load(f)
+        arrays = {name: np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r') for name in _ARRAY_NAMES}
+        return cls(metadata['vocabulary'], metadata['casefold'], **arrays)
@@ -0,0 +1,29 @@
+from tokenizer import sentence_split_spans
+from tokenizer import sentence_split_stream
+from tokenizer import unicode_tokenize
+from tokenizer import unicode_tokenize_stream
+
+
+def test_streams_long_run_without_breaks():
+    # e.g. a base64 blob: every chunk continues the same word, which used to make the streams quadratic
+    chunks = ['aB3x' * (1 << 14)] * 100
+    text = ''.join(chunks)
+
+    assert list(unicode_tokenize_stream(chunks)) == [text]
+    assert list(unicode_tokenize_stream(chunks, merge_apostrophe_word=True)) == [text]
+    assert list(sentence_split_stream(chunks)) == [(0, len(text), text)]
+    assert list(sentence_split_stream(chunks, merge_apostrophe_word=True)) == [(0, len(text), text)]
+
+
+def test_streams_match_whole_text():
+    text = "it's a test.  isn't it?\n\nyes!\r\n\r\nno'   'words. end"
+    for chunk_size in range(1, len(text) + 1):
+        chunks = [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)]
+        for merge_apostrophe_word in (False, True):
+            assert list(unicode_tokenize_stream(chunks, as_tokens=True, merge_apostrophe_word=merge_apostrophe_word)) \
+                   == list(unicode_tokenize(text, as_tokens=True, merge_apostrophe_word=merge_apostrophe_word))
+            for split_newline in (True, False, '\r\n\r\n'):
+                expected = [(start, end, text[start:end])
+                            for start, end, _ in sentence_split_spans(text, split_newline, merge_apostrophe_word)
+                            if start < end]
+                assert list(sentence_split_stream(chunks, split_newline, merge_apostrophe_word)) == expected
@@ -1,17 +1,38 @@
+import re
+import sys
+from array import array
+from bisect import bisect_left
 from collections import namedtuple
 from enum import Enum
 from enum import auto
 from functools import lru_cache
+from functools import partial
+from hashlib import blake2b
+from itertools import chain
 from typing import Any
+from typing import Dict
 from typing import Generator
 from typing import Iterable
+from typing import Iterator
 from typing import List
+from typing import Optional
+from typing import Pattern
 from typing import Set
+from typing import TextIO
 from typing import Tuple
 from typing import Union
 
 import unicodedata
 
+from disk_cache import cache_path
+from disk_cache import read_cache_file
+from disk_cache import write_cache_file
+
+try:
+    import numpy as np
+except ImportError:  # numpy is only needed for `unicode_tokenize_spans`, the 'numpy' engine, and as_numpy=True
+    np = None
+
 
 class TokenCategory(Enum):
     WORD = auto()
@@ -21,6 +42,41 @@ class TokenCategory(Enum):
 
 Token = namedtuple('Token', ['text', 'start_pos', 'category'])
 
+
+class TokenView:
+    """
+    lazy alternative to Token, which only slices `text` out of the source string when it is first accessed
+    has the same fields as Token (and unpacks the same way), plus `end_pos`
+    """
+    __slots__ = ('source', 'start_pos', 'end_pos', 'category', '_text')
+
+    def __init__(self, source: str, start_pos: int, end_pos: int, category: TokenCategory):
+        self.source = source
+        self.start_pos = start_pos
+        self.end_pos = end_pos
+        self.category = category
+        self._text = None
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            self._text = self.source[self.start_pos:self.end_pos]
+        return self._text
+
+    def __len__(self) -> int:
+        return self.end_pos - self.start_pos
+
+    def __iter__(self):
+        return iter((self.text, self.start_pos, self.category))
+
+    def __repr__(self) -> str:
+        return f'TokenView(text={self.text!r}, start_pos={self.start_pos}, end_pos={self.end_pos}, ' \
+               f'category={self.category})'
+
+    def to_token(self) -> Token:
+        return Token(self.text, self.start_pos, self.category)
+
+
 UNICODE_SPACES: Set[str] = {  # refer to: https://en.wikipedia.org/wiki/Whitespace_character
     # unicode whitespace
     '\u0009',  # horizontal tab == '\t'
@@ -149,50 +205,190 @@ APOSTROPHES: Set[str] = {
 }
 
 
+# bitflags for the codepoint classification table
+_CHAR_WORD = 0x01  # letters and diacritics
+_CHAR_TEXT = 0x02  # letters, numbers, diacritics, and private use chars
+_CHAR_COMBINING = 0x04  # diacritics, spacing marks, enclosing marks
+_CHAR_PUNCTUATION = 0x08  # punctuation, symbols, and unprintable chars
+_CHAR_SPACE = 0x10  # see UNICODE_SPACES
+
+_CATEGORY_FLAGS: Dict[str, int] = {
+    'Lu': _CHAR_WORD | _CHAR_TEXT,  # letters
+    'Ll': _CHAR_WORD | _CHAR_TEXT,
+    'Lt': _CHAR_WORD | _CHAR_TEXT,
+    'Lm': _CHAR_WORD | _CHAR_TEXT,
+    'Lo': _CHAR_WORD | _CHAR_TEXT,
+    'Nd': _CHAR_TEXT,  # numbers
+    'Nl': _CHAR_TEXT,
+    'No': _CHAR_TEXT,
+    'Mn': _CHAR_WORD | _CHAR_TEXT | _CHAR_COMBINING,  # diacritics, etc
+    'Mc': _CHAR_WORD | _CHAR_TEXT | _CHAR_COMBINING,
+    'Me': _CHAR_WORD | _CHAR_TEXT | _CHAR_COMBINING,
+    'Co': _CHAR_TEXT,  # private use char class
+    'Pc': _CHAR_PUNCTUATION,  # punctuation
+    'Pd': _CHAR_PUNCTUATION,
+    'Ps': _CHAR_PUNCTUATION,
+    'Pe': _CHAR_PUNCTUATION,
+    'Pi': _CHAR_PUNCTUATION,
+    'Pf': _CHAR_PUNCTUATION,
+    'Po': _CHAR_PUNCTUATION,
+    'Sm': _CHAR_PUNCTUATION,  # symbols
+    'Sc': _CHAR_PUNCTUATION,
+    'Sk': _CHAR_PUNCTUATION,
+    'So': _CHAR_PUNCTUATION,
+}
+
+
+def _build_char_flags() -> bytearray:
+    """
+    classify every codepoint once, so the hot loops only need to do `_CHAR_FLAGS[ord(char)]`
+    takes about a third of a second, and uses 1.1MB (one byte per codepoint)
+    """
+    char_flags = bytearray(_CATEGORY_FLAGS.get(unicodedata.category(chr(codepoint)), 0)
+                           for codepoint in range(0x110000))
+    for char in UNPRINTABLE_CHARS | CLOSING_PUNCTUATION:
+        char_flags[ord(char)] |= _CHAR_PUNCTUATION
+    for char in UNICODE_SPACES:
+        char_flags[ord(char)] |= _CHAR_SPACE
+    return char_flags
+
+
+def _char_flags_path() -> str:
+    # keyed by the unicode version and the tables above, so editing either one rebuilds the cache
+    tables = repr((sorted(_CATEGORY_FLAGS.items()),
+                   sorted(UNPRINTABLE_CHARS | CLOSING_PUNCTUATION),
+                   sorted(UNICODE_SPACES)))
+    digest = blake2b(tables.encode('utf8', 'surrogatepass'), digest_size=8).hexdigest()
+    return cache_path(f'char_flags-{unicodedata.unidata_version}-{digest}.bin')
+
+
+def _load_char_flags(path: str) -> Optional[bytearray]:
+    data = read_cache_file(path)
+    if data is None or len(data) != 0x110000:
+        return None
+    return bytearray(data)
+
+
+def _get_char_flags() -> bytearray:
+    path = _char_flags_path()
+    char_flags = _load_char_flags(path)
+    if char_flags is None:
+        char_flags = _build_char_flags()
+        write_cache_file(path, char_flags)
+    return char_flags
+
+
+# built once per unicode version and cached on disk (loading it takes about a millisecond)
+# so every import (and every worker process) doesn't have to classify all the codepoints again
+_CHAR_FLAGS: bytearray = _get_char_flags()
+
+
+def _codepoint_ranges(flag: int, first: int = 0, last: int = 0x10FFFF) -> Iterator[Tuple[int, int]]:
+    """
+    (start, end) ranges of codepoints with the given flag set, found by a regex scan over the flags table
+    """
+    flag_bytes = bytes(value for value in range(256) if value & flag)
+    for match in re.finditer(b'[' + re.escape(flag_bytes) + b']+', _CHAR_FLAGS[first:last + 1]):
+        yield first + match.start(), first + match.end()
+
+
+def _char_class(flag: int, first: int = 0, last: int = 0x10FFFF) -> str:
+    """
+    regex character class contents (without the brackets) matching codepoints with the given flag set
+    """
+    ranges = []
+    for start, end in _codepoint_ranges(flag, first, last):
+        end -= 1
+        ranges.append(f'\\U{start:08X}' if start == end else f'\\U{start:08X}-\\U{end:08X}')
+    return ''.join(ranges)
+
+
+@lru_cache(maxsize=None)
+def _run_pattern_parts() -> Dict[str, str]:
+    """
+    the building blocks of the run engine's regexes, see `_RUN_REGEXES`
+    """
+    # builtins.re only builds a fast lookup table for the BMP, so astral text chars would each cost a linear scan
+    # over a few hundred ranges; to avoid that, only check astral chars (rare) against the astral class after the fact
+    # the run is an atomic group, since backtracking into it can never help (a run always ends at a non-text char),
+    # and the nested quantifier would otherwise try every way of splitting a word when the merged-word lookahead fails
+    text_class_bmp = _char_class(_CHAR_TEXT, last=0xFFFF)
+    text_class_astral = _char_class(_CHAR_TEXT, first=0x10000)
+    text_char = f'(?:[{text_class_bmp}]|[\\U00010000-\\U0010FFFF](?<=[{text_class_astral}]))'
+    text_run = f'(?>(?:[{text_class_bmp}]+|[\\U00010000-\\U0010FFFF](?<=[{text_class_astral}]))+)'
+    apostrophe = f'[{"".join(sorted(APOSTROPHES))}]'
+
+    # word-apostrophe-word, but only if there are no other apostrophes/words attached on either side
+    # the second alternative is needed since a lookbehind failure must not prevent matching a plain word
+    merged_text_run = (f'(?<!{apostrophe}){text_run}'
+                       f'(?:{apostrophe}{text_run}'
+                       f'(?!{text_char}|{apostrophe}))?'
+                       f'|{text_run}')
+
+    return {
+        'text_run': text_run,
+        'merged_text_run': merged_text_run,
+        'space': f'[{_char_class(_CHAR_SPACE)}]',
+    }
+
+
+_RUN_REGEXES: Dict[str, str] = {
+    'text': '{text_run}',
+    'merged_text': '{merged_text_run}',
+    'token': '{text_run}|.',
+    'categorized': '({text_run})|({space})|.',
+    'merged_categorized': '({merged_text_run})|({space})|.',
+
+    # same as above, but with one token per whitespace run
+    'categorized_space': '({text_run})|({space}+)|.',
+    'merged_categorized_space': '({merged_text_run})|({space}+)|.',
+}
+
+
 @lru_cache(maxsize=None)
+def _run_regex(name: str) -> Pattern:
+    """
+    compiled when first used rather than at import, since the char classes are huge (about 30ms per regex)
+    """
+    return re.compile(_RUN_REGEXES[name].format(**_run_pattern_parts()), flags=re.DOTALL)
+
+
+# indexed by `match.lastindex` for all the categorized patterns above
+_RUN_CATEGORIES = (TokenCategory.PUNCTUATION, TokenCategory.WORD, TokenCategory.WHITESPACE)
+
+
 def is_word_char(char: str) -> bool:
     # return regex.fullmatch(r'[\p{L}\p{M}]', char, flags=regex.UNICODE)
-    return unicodedata.category(char) in {'Lu', 'Ll', 'Lt', 'Lm', 'Lo',  # letters
-                                          'Mn', 'Mc', 'Me',  # diacritics, etc
-                                          }
+    return bool(_CHAR_FLAGS[ord(char)] & _CHAR_WORD)
 
 
-@lru_cache(maxsize=None)
 def is_text_char(char: str) -> bool:
-    return unicodedata.category(char) in {'Lu', 'Ll', 'Lt', 'Lm', 'Lo',  # letters
-                                          'Nd', 'Nl', 'No',  # numbers
-                                          'Mn', 'Mc', 'Me',  # diacritics, etc
-                                          'Co',  # private use char class
-                                          }  # or \
-    # unicodedata.category(char) in {'Sk',  # modifier symbols
-    #                                } and ord(char) < 0xFFFF  # except emoji modifiers
+    # letters, numbers, diacritics, private use
+    # todo: modifier symbols ('Sk') except emoji modifiers?
+    return bool(_CHAR_FLAGS[ord(char)] & _CHAR_TEXT)
 
 
-@lru_cache(maxsize=None)
 def is_text_combining_char(char: str) -> bool:
-    return unicodedata.category(char) in {'Mn',  # diacritics
-                                          'Mc',  # spacing marks
-                                          'Me',  # enclosing marks
-                                          }  # or \
-    # unicodedata.category(char) in {'Sk',  # modifier symbols
-    #                                } and ord(char) < 0xFFFF  # except emoji modifiers
+    # diacritics, spacing marks, enclosing marks
+    # todo: modifier symbols ('Sk') except emoji modifiers?
+    return bool(_CHAR_FLAGS[ord(char)] & _CHAR_COMBINING)
+
+
+def text_combining_codepoints() -> Iterator[int]:
+    """
+    every codepoint for which `is_text_combining_char` is true, without checking each one in python
+    """
+    for start, end in _codepoint_ranges(_CHAR_COMBINING):
+        yield from range(start, end)
 
 
-@lru_cache(maxsize=None)
 def is_punctuation_char(char: str) -> bool:
-    if char in UNPRINTABLE_CHARS:
-        return True
-    elif char in CLOSING_PUNCTUATION:
-        return True  # this should always be caught by the unicode category check below, but why not
-    else:
-        return unicodedata.category(char) in {'Pc', 'Pd', 'Ps', 'Pe', 'Pi', 'Pf', 'Po',
-                                              'Sm', 'Sc', 'Sk', 'So',
-                                              }
+    # punctuation, symbols, unprintable chars, and closing punctuation
+    return bool(_CHAR_FLAGS[ord(char)] & _CHAR_PUNCTUATION)
 
 
-@lru_cache(maxsize=None)
 def is_space_char(char: str) -> bool:
-    return char in UNICODE_SPACES
+    return bool(_CHAR_FLAGS[ord(char)] & _CHAR_SPACE)
 
 
 def _merge_apostrophes_into_words(tokens: Iterable[Token]) -> Generator[Token, Any, None]:
@@ -271,10 +467,11 @@ def _merge_apostrophes_into_words(tokens: Iterable[Token]) -> Generator[Token, A
 def _unicode_tokenize_all_strings(text: str) -> Generator[str, Any, None]:
     # todo: special handling for U+00AD (Soft Hyphen)?
 
+    char_flags = _CHAR_FLAGS  # local lookup is faster
     word_buffer: List[str] = []
     for idx, char in enumerate(text):
         # char is part of word
-        if is_text_char(char):
+        if char_flags[ord(char)] & _CHAR_TEXT:
             word_buffer.append(char)
 
         # char is whitespace/punctuation/symbol/unprintable
@@ -291,11 +488,12 @@ def _unicode_tokenize_all_strings(text: str) -> Generator[str, Any, None]:
 
 
 def _unicode_tokenize_all_tokens(text: str) -> Generator[Token, Any, None]:
+    char_flags = _CHAR_FLAGS  # local lookup is faster
     word_buffer: List[str] = []
     start_idx = None
     for idx, char in enumerate(text):
         # char is part of word
-        if is_text_char(char):
+        if char_flags[ord(char)] & _CHAR_TEXT:
             # buffer is empty
             if not word_buffer:
                 word_buffer = [char]
@@ -305,7 +503,7 @@ def _unicode_tokenize_all_tokens(text: str) -> Generator[Token, Any, None]:
                 word_buffer.append(char)
 
         # char is whitespace
-        elif is_space_char(char):
+        elif char_flags[ord(char)] & _CHAR_SPACE:
             if word_buffer:
                 yield Token(''.join(word_buffer), start_idx, TokenCategory.WORD)
                 word_buffer.clear()
@@ -328,10 +526,11 @@ def _unicode_tokenize_all_tokens(text: str) -> Generator[Token, Any, None]:
 def _unicode_tokenize_word_strings(text: str) -> Generator[str, Any, None]:
     # for word in regex.finditer(r'\w+', text, flags=regex.U):
     #     yield word.group(0)
+    char_flags = _CHAR_FLAGS  # local lookup is faster
     word_buffer: List[str] = []
     for char in text:
         # char is part of word
-        if is_text_char(char):
+        if char_flags[ord(char)] & _CHAR_TEXT:
             word_buffer.append(char)
 
         # char is non-text AND buffer is text
@@ -345,11 +544,12 @@ def _unicode_tokenize_word_strings(text: str) -> Generator[str, Any, None]:
 
 
 def _unicode_tokenize_word_tokens(text: str) -> Generator[Token, Any, None]:
+    char_flags = _CHAR_FLAGS  # local lookup is faster
     word_buffer: List[str] = []
     start_idx = None
     for idx, char in enumerate(text):
         # char is part of word
-        if is_text_char(char):
+        if char_flags[ord(char)] & _CHAR_TEXT:
             if not word_buffer:
                 word_buffer = [char]
                 start_idx = idx
@@ -366,16 +566,253 @@ def _unicode_tokenize_word_tokens(text: str) -> Generator[Token, Any, None]:
         yield Token(''.join(word_buffer), start_idx, TokenCategory.WORD)
 
 
+def _unicode_tokenize_runs_all_strings(text: str) -> Iterator[str]:
+    return map(re.Match.group, _run_regex('token').finditer(text))
+
+
+def _unicode_tokenize_runs_all_tokens(text: str) -> Generator[Token, Any, None]:
+    categories = _RUN_CATEGORIES
+    for match in _run_regex('categorized').finditer(text):
+        yield Token(match.group(), match.start(), categories[match.lastindex or 0])
+
+
+def _unicode_tokenize_runs_word_strings(text: str) -> Iterator[str]:
+    return map(re.Match.group, _run_regex('text').finditer(text))
+
+
+def _unicode_tokenize_runs_word_tokens(text: str) -> Generator[Token, Any, None]:
+    for match in _run_regex('text').finditer(text):
+        yield Token(match.group(), match.start(), TokenCategory.WORD)
+
+
+@lru_cache(maxsize=None)
+def _numpy_category_table() -> 'np.ndarray':
+    """
+    TokenCategory.value of every codepoint, as a uint8 array that can be indexed by a whole array of codepoints
+    """
+    char_flags = np.frombuffer(_CHAR_FLAGS, dtype=np.uint8)
+    category_table = np.full(len(char_flags), TokenCategory.PUNCTUATION.value, dtype=np.uint8)
+    category_table[(char_flags & _CHAR_SPACE) != 0] = TokenCategory.WHITESPACE.value
+    category_table[(char_flags & _CHAR_TEXT) != 0] = TokenCategory.WORD.value
+    return category_table
+
+
+def unicode_tokenize_spans(text: str,
+                           words_only: bool = False,
+                           merge_apostrophe_word: bool = False,
+                           merge_whitespace: bool = False,
+                           ) -> Tuple['np.ndarray', 'np.ndarray', 'np.ndarray']:
+    """
+    vectorized version of unicode_tokenize, without any per-char (or per-token) python code
+    returns three arrays: start offsets, end offsets, and categories (as `TokenCategory.value`)
+    tokens are the same as `unicode_tokenize(text, as_tokens=True)`, so `text[start:end]` gives the token text
+
+    :param text: string to be tokenized
+    :param words_only: whether or not to return punctuation/symbols/unprintable/whitespace
+    :param merge_apostrophe_word: e.g. "isn't" and "l'ensemble", see `unicode_tokenize`
+    :param merge_whitespace: one WHITESPACE token per run of whitespace, see `unicode_tokenize`
+    :return: (starts, ends, categories)
+    """
+    if np is None:
+        raise ImportError('unicode_tokenize_spans requires numpy')
+
+    codepoints = np.frombuffer(text.encode('utf-32-le', 'surrogatepass'), dtype='<u4')
+    categories = _numpy_category_table()[codepoints]
+    is_word = categories == TokenCategory.WORD.value
+
+    # an apostrophe becomes part of a word iff it is the only apostrophe in a run of word/apostrophe chars,
+    # and that run starts and ends with a word char
+    if merge_apostrophe_word:
+        is_apostrophe = np.isin(codepoints, [ord(char) for char in APOSTROPHES])
+        if is_apostrophe.any():
+            is_chunk = is_word | is_apostrophe
+            chunk_starts = np.flatnonzero(is_chunk & ~np.concatenate(([False], is_chunk[:-1])))
+            chunk_ends = np.flatnonzero(is_chunk & ~np.concatenate((is_chunk[1:], [False])))
+            chunk_ids = np.cumsum(np.isin(np.arange(len(is_chunk)), chunk_starts)) - 1
+            apostrophe_idxs = np.flatnonzero(is_apostrophe)
+            apostrophe_counts = np.bincount(chunk_ids[apostrophe_idxs], minlength=len(chunk_starts))
+            is_mergeable = (apostrophe_counts == 1) & is_word[chunk_starts] & is_word[chunk_ends]
+            merged_idxs = apostrophe_idxs[is_mergeable[chunk_ids[apostrophe_idxs]]]
+            is_word[merged_idxs] = True
+            categories = categories.copy()
+            categories[merged_idxs] = TokenCategory.WORD.value
+
+    # every char starts a new token, except a word char that follows another word char
+    # (or a whitespace char that follows another whitespace char, if merging whitespace)
+    is_boundary = np.ones(len(categories), dtype=bool)
+    is_boundary[1:] = ~(is_word[1:] & is_word[:-1])
+    if merge_whitespace and not words_only:
+        is_space = categories == TokenCategory.WHITESPACE.value
+        is_boundary[1:] &= ~(is_space[1:] & is_space[:-1])
+
+    starts = np.flatnonzero(is_boundary)
+    ends = np.empty_like(starts)
+    ends[:-1] = starts[1:]
+    ends[-1:] = len(categories)
+    categories = categories[starts]
+
+    if words_only:
+        is_word = categories == TokenCategory.WORD.value
+        return starts[is_word], ends[is_word], categories[is_word]
+    return starts, ends, categories
+
+
+def _unicode_tokenize_numpy_strings(text: str, words_only: bool) -> Iterator[str]:
+    starts, ends, _ = unicode_tokenize_spans(text, words_only=words_only)
+    return map(text.__getitem__, map(slice, starts.tolist(), ends.tolist()))
+
+
+def _unicode_tokenize_numpy_tokens(text: str, words_only: bool) -> Generator[Token, Any, None]:
+    categories_by_value = {category.value: category for category in TokenCategory}
+    starts, ends, categories = unicode_tokenize_spans(text, words_only=words_only)
+    for start, end, category in zip(starts.tolist(), ends.tolist(), categories.tolist()):
+        yield Token(text[start:end], start, categories_by_value[category])
+
+
+def _unicode_tokenize_char_spans(text: str,
+                                 words_only: bool,
+                                 merge_apostrophe_word: bool = False,
+                                 merge_whitespace: bool = False,
+                                 ) -> Generator[Tuple[int, int, TokenCategory], Any, None]:
+    char_flags = _CHAR_FLAGS  # local lookup is faster
+    merge_whitespace = merge_whitespace and not words_only
+    start_idx = None
+    space_idx = None  # start of the current whitespace run, if merging whitespace
+    apostrophe_idx = None  # an apostrophe that was tentatively merged into the current word
+    after_apostrophe = False  # a word directly after an apostrophe can never be merged
+    mergeable = False
+    for idx, char in enumerate(text):
+        flags = char_flags[ord(char)]
+
+        # char is part of word
+        if flags & _CHAR_TEXT:
+            if start_idx is None:
+                if space_idx is not None:
+                    yield space_idx, idx, TokenCategory.WHITESPACE
+                    space_idx = None
+                start_idx = idx
+                mergeable = merge_apostrophe_word and not after_apostrophe
+            continue
+
+        # char is whitespace/punctuation/symbol/unprintable
+        if start_idx is not None:
+            if mergeable and char in APOSTROPHES:
+                # first apostrophe, and the next char starts a word: tentatively merge
+                if apostrophe_idx is None:
+                    if idx + 1 < len(text) and char_flags[ord(text[idx + 1])] & _CHAR_TEXT:
+                        apostrophe_idx = idx
+                        continue
+                    yield start_idx, idx, TokenCategory.WORD
+
+                # second apostrophe: un-merge the first one
+                else:
+                    yield start_idx, apostrophe_idx, TokenCategory.WORD
+                    if not words_only:
+                        yield apostrophe_idx, apostrophe_idx + 1, TokenCategory.PUNCTUATION
+                    yield apostrophe_idx + 1, idx, TokenCategory.WORD
+            else:
+                yield start_idx, idx, TokenCategory.WORD
+            start_idx = None
+            apostrophe_idx = None
+
+        after_apostrophe = merge_apostrophe_word and char in APOSTROPHES
+        if merge_whitespace:
+            if flags & _CHAR_SPACE:
+                if space_idx is None:
+                    space_idx = idx
+                continue
+            if space_idx is not None:
+                yield space_idx, idx, TokenCategory.WHITESPACE
+                space_idx = None
+        if not words_only:
+            yield idx, idx + 1, TokenCategory.WHITESPACE if flags & _CHAR_SPACE else TokenCategory.PUNCTUATION
+
+    # yield remainder
+    if start_idx is not None:
+        yield start_idx, len(text), TokenCategory.WORD
+    elif space_idx is not None:
+        yield space_idx, len(text), TokenCategory.WHITESPACE
+
+
+def _unicode_tokenize_runs_spans(text: str,
+                                 words_only: bool,
+                                 merge_apostrophe_word: bool = False,
+                                 merge_whitespace: bool = False,
+                                 pos: int = 0,
+                                 endpos: int = sys.maxsize,
+                                 ) -> Generator[Tuple[int, int, TokenCategory], Any, None]:
+    # pos and endpos allow tokenizing part of a string without copying it
+    if words_only:
+        pattern = _run_regex('merged_text' if merge_apostrophe_word else 'text')
+        for match in pattern.finditer(text, pos, endpos):
+            yield match.start(), match.end(), TokenCategory.WORD
+    else:
+        categories = _RUN_CATEGORIES
+        if merge_whitespace:
+            pattern = _run_regex('merged_categorized_space' if merge_apostrophe_word else 'categorized_space')
+        else:
+            pattern = _run_regex('merged_categorized' if merge_apostrophe_word else 'categorized')
+        for match in pattern.finditer(text, pos, endpos):
+            yield match.start(), match.end(), categories[match.lastindex or 0]
+
+
+def _unicode_tokenize_numpy_spans(text: str,
+                                  words_only: bool,
+                                  merge_apostrophe_word: bool = False,
+                                  merge_whitespace: bool = False,
+                                  ) -> Iterator[Tuple[int, int, TokenCategory]]:
+    categories_by_value = {category.value: category for category in TokenCategory}
+    starts, ends, categories = unicode_tokenize_spans(text, words_only, merge_apostrophe_word, merge_whitespace)
+    return zip(starts.tolist(), ends.tolist(), map(categories_by_value.__getitem__, categories.tolist()))
+
+
+_SPAN_ENGINES = {
+    'char': _unicode_tokenize_char_spans,
+    'run': _unicode_tokenize_runs_spans,
+    'numpy': _unicode_tokenize_numpy_spans,
+}
+
+
+def _unicode_tokenize_views(text: str,
+                            words_only: bool = False,
+                            merge_apostrophe_word: bool = False,
+                            merge_whitespace: bool = False,
+                            engine: str = 'char',
+                            ) -> Generator[TokenView, Any, None]:
+    for start, end, category in _SPAN_ENGINES[engine](text, words_only, merge_apostrophe_word, merge_whitespace):
+        yield TokenView(text, start, end, category)
+
+
+# (word tokens, all tokens, word strings, all strings)
+_ENGINES = {
+    'char': (_unicode_tokenize_word_tokens,
+             _unicode_tokenize_all_tokens,
+             _unicode_tokenize_word_strings,
+             _unicode_tokenize_all_strings),
+    'run': (_unicode_tokenize_runs_word_tokens,
+            _unicode_tokenize_runs_all_tokens,
+            _unicode_tokenize_runs_word_strings,
+            _unicode_tokenize_runs_all_strings),
+    'numpy': (partial(_unicode_tokenize_numpy_tokens, words_only=True),
+              partial(_unicode_tokenize_numpy_tokens, words_only=False),
+              partial(_unicode_tokenize_numpy_strings, words_only=True),
+              partial(_unicode_tokenize_numpy_strings, words_only=False)),
+}
+
+
 def unicode_tokenize(text: str,
                      words_only: bool = False,
                      as_tokens: bool = False,
                      merge_apostrophe_word: bool = False,
-                     ) -> Generator[Union[str, Token], Any, None]:
+                     engine: str = 'char',
+                     lazy_text: bool = False,
+                     merge_whitespace: bool = False,
+                     ) -> Generator[Union[str, Token, TokenView], Any, None]:
     """
     similar to fts5's unicode61 tokenizer, but allows diacritics
 
     merge_apostrophe_word puts apostrophes back into the middle of a word (max one apostrophe)
-    use with caution because it might not be what you want, and also it's slower
+    use with caution because it might not be what you want
     handles full-width quotes and right curly quotes
     examples:
     (1)                   [O] ['] [reilly]    ->  [O'reilly]                  (likely desirable)
@@ -388,83 +825,313 @@ def unicode_tokenize(text: str,
     :param text: string to be tokenized
     :param words_only: whether or not to return punctuation/symbols/unprintable/whitespace
     :param as_tokens: return as Token namedtuple (includes start_position and token_category)
-    :param merge_apostrophe_word: WARNING SLOW! e.g. "isn't" and "l'ensemble"
+    :param merge_apostrophe_word: e.g. "isn't" and "l'ensemble"
+    :param engine: 'char' loops over each char, 'run' regex-scans whole runs (same output, faster on long texts),
+                   'numpy' uses `unicode_tokenize_spans` (same output, needs numpy)
+    :param lazy_text: with as_tokens, return TokenView objects that only slice out their text if it's accessed
+    :param merge_whitespace: one WHITESPACE token per run of whitespace (e.g. indentation) instead of one per char
     """
-
-    # use optimized functions for the un-merged cases
-    if not merge_apostrophe_word:
+    if engine not in _ENGINES:
+        raise ValueError(f'unknown engine: {engine!r}')
+    if as_tokens and lazy_text:
+        return _unicode_tokenize_views(text, words_only, merge_apostrophe_word, merge_whitespace, engine)
+    _word_tokens, _all_tokens, _word_strings, _all_strings = _ENGINES[engine]
+
+    # use optimized functions for the un-merged cases (there's no whitespace to merge if words_only)
+    if not merge_apostrophe_word and (words_only or not merge_whitespace):
         if as_tokens and words_only:
-            return _unicode_tokenize_word_tokens(text)
+            return _word_tokens(text)
 
         elif as_tokens:
-            return _unicode_tokenize_all_tokens(text)  # use `_unicode_tokenize_merge_spaces` to merge spaces
+            return _all_tokens(text)
 
         elif words_only:
-            return _unicode_tokenize_word_strings(text)  # probably fastest
+            return _word_strings(text)  # probably fastest
 
         else:
-            return _unicode_tokenize_all_strings(text)
+            return _all_strings(text)
 
-    # merging in the apostrophe is probably very slow (also it will break naive string search)
-    _generator = _merge_apostrophes_into_words(_unicode_tokenize_all_tokens(text))
-    if words_only:
-        _generator = (token for token in _generator if token.category is TokenCategory.WORD)
-    if not as_tokens:
-        _generator = (token.text for token in _generator)
-    return _generator
+    # the apostrophe and whitespace are merged in by the scanner itself
+    # (but note that merging apostrophes will break naive string search)
+    spans = _SPAN_ENGINES[engine](text, words_only, merge_apostrophe_word, merge_whitespace)
+    if as_tokens:
+        return (Token(text[start:end], start, category) for start, end, category in spans)
+    return (text[start:end] for start, end, _ in spans)
 
 
-def sentence_split_tokens(text: str,
-                          split_newline: Union[str, bool] = True,
-                          merge_apostrophe_word: bool = False,
-                          ) -> Generator[List[Token], Any, None]:
+class TokenArray:
     """
-    like sentence_split, but yields a list of Tokens which can be processed further
-
-    :param text: to split in sentences
-    :param split_newline: split paragraphs before sentence splitting
-    :param merge_apostrophe_word: slow and potentially undesirable, merges words with apostrophes
-    :return: list of Token objects
+    columnar alternative to a list of Tokens, about 9 bytes per token instead of 150+
+    stores only offsets into the source text and a category byte (`TokenCategory.value`) per token
+    token text is only sliced out of the source text when a token is accessed
+    offsets are unsigned 32-bit ints, so the source text must be shorter than 4GB
     """
-    token: Token
-
+    __slots__ = ('text', 'starts', 'ends', 'categories')
+
+    def __init__(self, text: str, starts: array, ends: array, categories: bytes):
+        assert len(starts) == len(ends) == len(categories)
+        self.text = text
+        self.starts = starts
+        self.ends = ends
+        self.categories = categories
+
+    @classmethod
+    def from_text(cls,
+                  text: str,
+                  words_only: bool = False,
+                  merge_apostrophe_word: bool = False,
+                  engine: str = 'char',
+                  merge_whitespace: bool = False,
+                  ) -> 'TokenArray':
+        """
+        tokenize text, see `unicode_tokenize` for the parameters
+        """
+        if engine == 'numpy':
+            starts, ends, categories = unicode_tokenize_spans(text, words_only, merge_apostrophe_word, merge_whitespace)
+            return cls(text,
+                       array('I', starts.astype(np.uint32).tobytes()),
+                       array('I', ends.astype(np.uint32).tobytes()),
+                       categories.tobytes())
+
+        starts = array('I')
+        ends = array('I')
+        categories = bytearray()
+        for token in unicode_tokenize(text,
+                                      words_only=words_only,
+                                      as_tokens=True,
+                                      merge_apostrophe_word=merge_apostrophe_word,
+                                      engine=engine,
+                                      lazy_text=True,
+                                      merge_whitespace=merge_whitespace):
+            starts.append(token.start_pos)
+            ends.append(token.end_pos)
+            categories.append(token.category.value)
+        return cls(text, starts, ends, bytes(categories))
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def __getitem__(self, item: Union[int, slice]) -> Union[Token, 'TokenArray']:
+        if isinstance(item, slice):
+            return TokenArray(self.text, self.starts[item], self.ends[item], self.categories[item])
+        start = self.starts[item]
+        return Token(self.text[start:self.ends[item]], start, TokenCategory(self.categories[item]))
+
+    def __iter__(self) -> Generator[Token, Any, None]:
+        text = self.text
+        categories_by_value = {category.value: category for category in TokenCategory}
+        for start, end, category in zip(self.starts, self.ends, self.categories):
+            yield Token(text[start:end], start, categories_by_value[category])
+
+    def __repr__(self) -> str:
+        return f'TokenArray(<{len(self)} tokens>)'
+
+    def texts(self) -> Iterator[str]:
+        """
+        token texts only, without building Token objects
+        """
+        return map(self.text.__getitem__, map(slice, self.starts, self.ends))
+
+    def to_numpy(self) -> Tuple['np.ndarray', 'np.ndarray', 'np.ndarray']:
+        """
+        zero-copy views of the (starts, ends, categories) columns, same format as `unicode_tokenize_spans`
+        """
+        if np is None:
+            raise ImportError('TokenArray.to_numpy requires numpy')
+        return (np.frombuffer(self.starts, dtype=np.uint32),
+                np.frombuffer(self.ends, dtype=np.uint32),
+                np.frombuffer(self.categories, dtype=np.uint8))
+
+    def paragraphs(self, split_newline: Union[str, bool] = True) -> Generator['TokenArray', Any, None]:
+        """
+        split into paragraphs, dropping any tokens in the whitespace stripped from each paragraph
+        see `sentence_split_tokens` for the meaning of split_newline
+        """
+        idx = 0
+        for para_start, para_end in _paragraph_spans(self.text, split_newline):
+            idx = bisect_left(self.starts, para_start, idx)
+            end_idx = bisect_left(self.starts, para_end, idx)
+            yield self[idx:end_idx]
+            idx = end_idx
+
+
+def _paragraph_separator(split_newline: Union[str, bool]) -> Optional[str]:
     if split_newline is True:
-        paragraphs = [para.strip() for para in text.split('\n')]
+        return '\n'
     elif split_newline:
         assert isinstance(split_newline, str)
-        paragraphs = [para.strip() for para in text.split(split_newline)]
+        return split_newline
     else:
-        paragraphs = [text.strip()]
+        return None
 
+
+def _strip_span(text: str,
+                start: int,
+                end: int,
+                leading: bool = True,
+                trailing: bool = True,
+                ) -> Tuple[int, int]:
+    """
+    same as `str.strip()`, but returns the stripped (start, end) instead of a copy
+    """
+    if leading:
+        while start < end and text[start].isspace():
+            start += 1
+    if trailing:
+        while end > start and text[end - 1].isspace():
+            end -= 1
+    return start, end
+
+
+def _paragraph_spans(text: str,
+                     split_newline: Union[str, bool] = True,
+                     ) -> Generator[Tuple[int, int], Any, None]:
+    """
+    (start, end) of each paragraph after stripping whitespace, like `[para.strip() for para in text.split('\\n')]`
+    """
+    separator = _paragraph_separator(split_newline)
+    para_start = 0
+    while True:
+        separator_idx = text.find(separator, para_start) if separator else -1
+        yield _strip_span(text, para_start, len(text) if separator_idx < 0 else separator_idx)
+
+        if separator_idx < 0:
+            break
+        para_start = separator_idx + len(separator)
+
+
+# may follow the closing punctuation without re-opening the sentence
+_SENTENCE_CLOSERS = frozenset({'"', '\uFF02',
+                               ')', '\uFF09',
+                               '>', '\uFF1E',
+                               ']', '\uFF3D',
+                               '}', '\uFF5D',
+                               '\u201D'})
+
+
+def _split_sentences(tokens: Iterable[Token]) -> Generator[List[Token], Any, None]:
+    """
+    split a paragraph's tokens into sentences
+    """
     buffer: List[Token] = []
-    for para in paragraphs:
-        buffer.clear()
-        closed = False
-        for token in unicode_tokenize(para, as_tokens=True, merge_apostrophe_word=merge_apostrophe_word):
-            buffer.append(token)
-
-            # sentence has ended iff whitespace follows the closing punctuation
-            if closed and token.category is TokenCategory.WHITESPACE:
-                if buffer:
-                    yield buffer
-                buffer.clear()
+    closed = False
+    for token in tokens:
+        buffer.append(token)
+
+        # sentence has ended iff whitespace follows the closing punctuation
+        if closed and token.category is TokenCategory.WHITESPACE:
+            yield buffer
+            buffer = []
+            closed = False
+            continue
+
+        # note that this can also un-close a sentence, e.g. for "192.168.1.1"
+        if token.text not in _SENTENCE_CLOSERS:
+            closed = token.text in CLOSING_PUNCTUATION
+
+    if buffer:
+        yield buffer
+
+
+def _sentence_spans(text: str, tokens: Iterable[Token]) -> Generator[Tuple[int, int, List[Token]], Any, None]:
+    for sentence_tokens in _split_sentences(tokens):
+        yield (*_strip_span(text,
+                            sentence_tokens[0].start_pos,
+                            sentence_tokens[-1].start_pos + len(sentence_tokens[-1].text)),
+               sentence_tokens)
+
+
+def _paragraph_sentence_spans(text: str,
+                              para_start: int,
+                              para_end: int,
+                              merge_apostrophe_word: bool,
+                              merge_whitespace: bool = False,
+                              ) -> Generator[Tuple[int, int, List[Token]], Any, None]:
+    # same as `_sentence_spans` over the run engine's tokens, but fused into a single loop since this is the hot path
+    if merge_whitespace:
+        pattern = _run_regex('merged_categorized_space' if merge_apostrophe_word else 'categorized_space')
+    else:
+        pattern = _run_regex('merged_categorized' if merge_apostrophe_word else 'categorized')
+    word = TokenCategory.WORD
+    whitespace = TokenCategory.WHITESPACE
+    categories = _RUN_CATEGORIES
+    buffer: List[Token] = []
+    closed = False
+    end = para_start
+    for match in pattern.finditer(text, para_start, para_end):
+        token_text = match.group()
+        category = categories[match.lastindex or 0]
+        buffer.append(Token(token_text, match.start(), category))
+        end = match.end()
+
+        # see `_split_sentences`, words and whitespace can't be closing punctuation
+        if category is word:
+            closed = False
+        elif category is whitespace:
+            if closed:
+                yield (*_strip_span(text, buffer[0].start_pos, end), buffer)
+                buffer = []
                 closed = False
-                continue
+        elif token_text not in _SENTENCE_CLOSERS:
+            closed = token_text in CLOSING_PUNCTUATION
 
-            # note that this can also un-close a sentence, e.g. for "192.168.1.1"
-            if token.text not in {'"', '\uFF02',
-                                  ')', '\uFF09',
-                                  '>', '\uFF1E',
-                                  ']', '\uFF3D',
-                                  '}', '\uFF5D',
-                                  '\u201D'}:
-                closed = token.text in CLOSING_PUNCTUATION
+    if buffer:
+        yield (*_strip_span(text, buffer[0].start_pos, end), buffer)
 
-        if buffer:
-            yield buffer
+
+def sentence_split_spans(text: Union[str, TokenArray],
+                         split_newline: Union[str, bool] = True,
+                         merge_apostrophe_word: bool = False,
+                         merge_whitespace: bool = False,
+                         ) -> Generator[Tuple[int, int, List[Token]], Any, None]:
+    """
+    single pass sentence splitting, without copying the text
+    yields (start, end, tokens) for each sentence, where `text[start:end]` is the sentence without surrounding spaces
+    tokens are the same as for sentence_split_tokens, and all offsets are relative to the whole text
+
+    :param text: to split in sentences (or an already-tokenized TokenArray)
+    :param split_newline: split paragraphs before sentence splitting
+    :param merge_apostrophe_word: potentially undesirable, merges words with apostrophes
+    :param merge_whitespace: one token per whitespace run (ignored for a TokenArray, which is already tokenized)
+    :return: (start, end, list of Token objects)
+    """
+    if isinstance(text, TokenArray):
+        for para_tokens in text.paragraphs(split_newline):
+            if merge_apostrophe_word:
+                para_tokens = _merge_apostrophes_into_words(para_tokens)
+            yield from _sentence_spans(text.text, para_tokens)
+
+    else:
+        for para_start, para_end in _paragraph_spans(text, split_newline):
+            yield from _paragraph_sentence_spans(text, para_start, para_end, merge_apostrophe_word, merge_whitespace)
+
+
+def sentence_split_tokens(text: Union[str, TokenArray],
+                          split_newline: Union[str, bool] = True,
+                          merge_apostrophe_word: bool = False,
+                          merge_whitespace: bool = False,
+                          ) -> Generator[List[Token], Any, None]:
+    """
+    like sentence_split, but yields a list of Tokens which can be processed further
+    start_pos is relative to the whole text, not to the paragraph
+    if given a TokenArray, paragraphs are split at token boundaries
+    with merge_whitespace, sentences are split in the same places, but the whole whitespace run after a sentence
+    belongs to that sentence (instead of its first char ending the sentence, and the rest starting the next one)
+
+    :param text: to split in sentences (or an already-tokenized TokenArray)
+    :param split_newline: split paragraphs before sentence splitting
+    :param merge_apostrophe_word: potentially undesirable, merges words with apostrophes
+    :param merge_whitespace: one token per whitespace run (ignored for a TokenArray, which is already tokenized)
+    :return: list of Token objects
+    """
+    for _, _, sentence_tokens in sentence_split_spans(text,
+                                                      split_newline=split_newline,
+                                                      merge_apostrophe_word=merge_apostrophe_word,
+                                                      merge_whitespace=merge_whitespace):
+        yield sentence_tokens
 
 
-def sentence_split(text: str,
+def sentence_split(text: Union[str, TokenArray],
                    split_newline: Union[str, bool] = True,
                    merge_apostrophe_word: bool = False,
                    ) -> Generator[str, Any, None]:
@@ -478,12 +1145,188 @@ def sentence_split(text: str,
     :param merge_apostrophe_word:
     :return:
     """
-    for sentence_tokens in sentence_split_tokens(text,
-                                                 split_newline=split_newline,
-                                                 merge_apostrophe_word=merge_apostrophe_word):
-        sentence = ''.join(token.text for token in sentence_tokens).strip()
-        if sentence:
-            yield sentence
+    source = text.text if isinstance(text, TokenArray) else text
+    for start, end, _ in sentence_split_spans(text,
+                                              split_newline=split_newline,
+                                              merge_apostrophe_word=merge_apostrophe_word):
+        if start < end:
+            yield source[start:end]
+
+
+def _iter_text_chunks(chunks: Union[Iterable[str], TextIO], chunk_size: int = 1 << 20) -> Iterator[str]:
+    # read files in fixed-size chunks, since iterating over a file yields lines, which may be arbitrarily long
+    if hasattr(chunks, 'read'):
+        return iter(partial(chunks.read, chunk_size), '')
+    return iter(chunks)
+
+
+def _word_run_start(text: str, pos: int, endpos: int, merge_apostrophe_word: bool) -> int:
+    """
+    start of the word (or word/apostrophe run, if merging) that ends at endpos, but not before pos
+    the streaming functions hold these back, since the next chunk may continue the word
+    """
+    char_flags = _CHAR_FLAGS  # local lookup is faster
+    while endpos > pos and (char_flags[ord(text[endpos - 1])] & _CHAR_TEXT or
+                            merge_apostrophe_word and text[endpos - 1] in APOSTROPHES):
+        endpos -= 1
+    return endpos
+
+
+def unicode_tokenize_stream(chunks: Union[Iterable[str], TextIO],
+                            words_only: bool = False,
+                            as_tokens: bool = False,
+                            merge_apostrophe_word: bool = False,
+                            ) -> Generator[Union[str, Token], Any, None]:
+    """
+    like unicode_tokenize, but for an iterable of text chunks (or a text file object) that may not fit in memory
+    words (and apostrophes, if merging) at the end of each chunk are held back until the next chunk arrives,
+    so tokens are the same as if the chunks had been joined, and start_pos is relative to the whole stream
+    a word that spans many chunks is only joined once it ends, so the time taken is linear in the length of the stream
+
+    :param chunks: iterable of str, or a file object opened in text mode
+    :param words_only: whether or not to return punctuation/symbols/unprintable/whitespace
+    :param as_tokens: return as Token namedtuple (includes start_position and token_category)
+    :param merge_apostrophe_word: e.g. "isn't" and "l'ensemble", see `unicode_tokenize`
+    """
+    held: List[str] = []  # the word at the end of the previous chunks
+    offset = 0  # of the held word in the stream
+    for chunk in _iter_text_chunks(chunks):
+        # everything before the trailing word is final, and the held word can only end in this chunk
+        cut = _word_run_start(chunk, 0, len(chunk), merge_apostrophe_word)
+        if cut == 0:
+            held.append(chunk)
+            continue
+
+        held.append(chunk)
+        buffer = ''.join(held)
+        cut += len(buffer) - len(chunk)
+        spans = _unicode_tokenize_runs_spans(buffer, words_only, merge_apostrophe_word, pos=0, endpos=cut)
+        for start, end, category in spans:
+            yield Token(buffer[start:end], offset + start, category) if as_tokens else buffer[start:end]
+        held = [buffer[cut:]]
+        offset += cut
+
+    # yield remainder
+    buffer = ''.join(held)
+    for start, end, category in _unicode_tokenize_runs_spans(buffer, words_only, merge_apostrophe_word):
+        yield Token(buffer[start:end], offset + start, category) if as_tokens else buffer[start:end]
+
+
+def _sentence_ends(text: str,
+                   pos: int,
+                   endpos: int,
+                   merge_apostrophe_word: bool,
+                   closed: bool,
+                   ) -> Tuple[List[int], bool]:
+    """
+    same rules as `_split_sentences`, but only returns the offset after the last token of each sentence
+    and whether the last sentence is closed, so that scanning can be resumed from endpos
+    """
+    pattern = _run_regex('merged_categorized' if merge_apostrophe_word else 'categorized')
+    word = TokenCategory.WORD
+    whitespace = TokenCategory.WHITESPACE
+    categories = _RUN_CATEGORIES
+    ends = []
+    for match in pattern.finditer(text, pos, endpos):
+        category = categories[match.lastindex or 0]
+        if category is word:
+            closed = False
+        elif category is whitespace:
+            if closed:
+                ends.append(match.end())
+                closed = False
+        else:
+            token_text = match.group()
+            if token_text not in _SENTENCE_CLOSERS:
+                closed = token_text in CLOSING_PUNCTUATION
+    return ends, closed
+
+
+def sentence_split_stream(chunks: Union[Iterable[str], TextIO],
+                          split_newline: Union[str, bool] = True,
+                          merge_apostrophe_word: bool = False,
+                          ) -> Generator[Tuple[int, int, str], Any, None]:
+    """
+    like sentence_split, but for an iterable of text chunks (or a text file object) that may not fit in memory
+    yields (start, end, sentence), where start and end are offsets relative to the whole stream
+    each chunk is scanned once, holding back only a trailing word (or word/apostrophe run, if merging) for the next
+    chunk like unicode_tokenize_stream does, so the time taken is linear in the length of the stream
+    the text of the current (unfinished) sentence is kept until it ends, so a huge paragraph without sentence breaks
+    (or with split_newline=False, a huge text without sentence breaks) will be held in memory
+
+    :param chunks: iterable of str, or a file object opened in text mode
+    :param split_newline: split paragraphs before sentence splitting
+    :param merge_apostrophe_word: potentially undesirable, merges words with apostrophes
+    :return: (start, end, sentence)
+    """
+    separator = _paragraph_separator(split_newline)
+    hold = len(separator) - 1 if separator else 0  # trailing chars that may be the start of a separator
+    held: List[str] = []  # a word at the end of the previous chunks, which can't be scanned until it ends
+    tail = ''  # the last few unscanned chars after the held word, which may be part of a separator
+    offset = 0  # of the held word in the stream
+    sentence: List[str] = []  # text of the current sentence from previous chunks
+    sentence_offset = 0  # of the current sentence in the stream
+    closed = False  # whether the current sentence has closing punctuation (so the next whitespace ends it)
+    for chunk in chain(_iter_text_chunks(chunks), [None]):
+        if chunk is not None:
+            # the held word can't contain a separator (or it would have been found already), so unless one
+            # starts in the tail or this chunk, or this chunk ends the held word, there is nothing to scan yet
+            recent = tail + chunk
+            hold_start = max(0, len(recent) - hold)
+            if (separator is None or separator not in recent) and \
+                    _word_run_start(recent, 0, hold_start, merge_apostrophe_word) == 0:
+                held.append(recent[:hold_start])
+                tail = recent[hold_start:]
+                continue
+            held.append(recent)
+        else:
+            held.append(tail)
+        buffer = ''.join(held)
+
+        pos = sentence_start = 0  # of the rest of the current sentence in buffer
+        while True:
+            # a complete paragraph can be scanned to the end
+            separator_idx = buffer.find(separator, pos) if separator else -1
+            if separator_idx >= 0 or chunk is None:
+                scan_end = hold_start = len(buffer) if separator_idx < 0 else separator_idx
+                sentence_ends, closed = _sentence_ends(buffer, pos, scan_end, merge_apostrophe_word, closed)
+                sentence_ends.append(scan_end)
+
+            # otherwise hold back the trailing word (and any part of a separator) until the next chunk
+            else:
+                hold_start = max(pos, len(buffer) - hold)
+                scan_end = _word_run_start(buffer, pos, hold_start, merge_apostrophe_word)
+                sentence_ends, closed = _sentence_ends(buffer, pos, scan_end, merge_apostrophe_word, closed)
+
+            for sentence_end in sentence_ends:
+                if sentence:
+                    sentence.append(buffer[sentence_start:sentence_end])
+                    text = ''.join(sentence)
+                    sentence = []
+                    start, end = _strip_span(text, 0, len(text))
+                    if start < end:
+                        yield sentence_offset + start, sentence_offset + end, text[start:end]
+                else:
+                    start, end = _strip_span(buffer, sentence_start, sentence_end)
+                    if start < end:
+                        yield offset + start, offset + end, buffer[start:end]
+                sentence_start = sentence_end
+                sentence_offset = offset + sentence_end
+
+            if separator_idx < 0:
+                break
+
+            # start the next paragraph
+            pos = sentence_start = separator_idx + len(separator)
+            sentence_offset = offset + sentence_start
+            closed = False
+
+        # keep only the unscanned text
+        if sentence_start < scan_end:
+            sentence.append(buffer[sentence_start:scan_end])
+        held = [buffer[scan_end:hold_start]]
+        tail = buffer[hold_start:]
+        offset += scan_end
 
 
 def text_n_grams(text: str,
@@ -494,7 +1337,7 @@ def text_n_grams(text: str,
     return [text[i:i + n] for i in range(len(text) - n + 1)]
 
 
-def word_n_grams(text: str,
+def word_n_grams(text: Union[str, TokenArray],
                  n: int = 2,
                  split_sentences: bool = True,
                  merge_apostrophe_word: bool = False,
@@ -504,10 +1347,10 @@ def word_n_grams(text: str,
     note that split_sentences will also split paragraphs by default
     WARNING: if there are less than N tokens, no n-grams will be returned for the sentence
 
-    :param text: to split
+    :param text: to split (or an already-tokenized TokenArray)
     :param n: how long is the n-gram
     :param split_sentences: don't allow n-grams to span sentences
-    :param merge_apostrophe_word: WARNING SLOW! see tokenize function
+    :param merge_apostrophe_word: see tokenize function
     :return:
     """
     # if n == 1, you're using the wrong function
@@ -519,7 +1362,159 @@ def word_n_grams(text: str,
             for n_gram in zip(*[words[i:] for i in range(n)]):
                 yield n_gram
 
+    elif isinstance(text, TokenArray):
+        tokens = _merge_apostrophes_into_words(text) if merge_apostrophe_word else text
+        words = [token.text for token in tokens if token.category is TokenCategory.WORD]
+        for n_gram in zip(*[words[i:] for i in range(n)]):
+            yield n_gram
+
     else:
         words = list(unicode_tokenize(text, words_only=True, merge_apostrophe_word=merge_apostrophe_word))
         for n_gram in zip(*[words[i:] for i in range(n)]):
             yield n_gram
+
+
+# polynomial rolling hash mod 2**64, the base is odd so that it's invertible (which lets numpy vectorize the prefix)
+_HASH_MASK = (1 << 64) - 1
+_HASH_BASE = 0x100000001B3  # 64-bit FNV prime
+_HASH_BASE_INVERSE = pow(_HASH_BASE, -1, 1 << 64)
+_HASH_SIZE_SEED = 0x9E3779B97F4A7C15  # golden ratio, mixed in so n-grams of different sizes don't collide
+
+
+def _mix64(value: int) -> int:
+    # splitmix64 finalizer, since the low bits of a polynomial hash mod 2**64 are weak
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & _HASH_MASK
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & _HASH_MASK
+    return value ^ (value >> 31)
+
+
+def _mix64_numpy(values: 'np.ndarray') -> 'np.ndarray':
+    # same as _mix64, uint64 arithmetic wraps around
+    values = (values ^ (values >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    values = (values ^ (values >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return values ^ (values >> np.uint64(31))
+
+
+@lru_cache(maxsize=1 << 16)
+def stable_hash(text: str) -> int:
+    """
+    64-bit hash of a string that is the same across processes and python versions, unlike `hash(text)`
+    used for the n-gram hashes here and by `HeavyHitters`, so their hashes can be compared and merged
+    """
+    return int.from_bytes(blake2b(text.encode('utf8', 'surrogatepass'), digest_size=8).digest(), 'little')
+
+
+def _n_gram_hashes(values: List[int],
+                   n: int,
+                   max_n: Optional[int],
+                   group_ids: Optional[List[int]] = None,
+                   as_numpy: bool = False,
+                   ) -> Union[array, 'np.ndarray']:
+    """
+    64-bit hashes of every n..max_n consecutive values (which must all have the same group id, if given)
+    the prefix hashes are computed in a single pass, after which each n-gram hash takes O(1)
+    """
+    max_n = n if max_n is None else max_n
+    assert 1 <= n <= max_n
+
+    if np is not None:
+        values = np.asarray(values, dtype=np.uint64)
+        inverse_powers = np.ones(len(values), dtype=np.uint64)
+        inverse_powers[1:] = _HASH_BASE_INVERSE
+        powers = np.ones(len(values), dtype=np.uint64)
+        powers[1:] = _HASH_BASE
+
+        # prefix[k] = sum(values[j] * base ** (k - 1 - j) for j in range(k)), without a python loop
+        prefix = np.zeros(len(values) + 1, dtype=np.uint64)
+        prefix[1:] = np.cumprod(powers) * np.cumsum(values * np.cumprod(inverse_powers))
+        if group_ids is not None:
+            group_ids = np.asarray(group_ids)
+
+        hashes = []
+        for size in range(n, min(max_n, len(values)) + 1):
+            n_gram_hashes = prefix[size:] - prefix[:-size] * np.uint64(pow(_HASH_BASE, size, 1 << 64))
+            if group_ids is not None:
+                n_gram_hashes = n_gram_hashes[group_ids[:len(group_ids) - size + 1] == group_ids[size - 1:]]
+            hashes.append(_mix64_numpy(n_gram_hashes + np.uint64(size * _HASH_SIZE_SEED & _HASH_MASK)))
+        hashes = np.concatenate(hashes) if hashes else np.zeros(0, dtype=np.uint64)
+        return hashes if as_numpy else array('Q', hashes.tobytes())
+
+    if as_numpy:
+        raise ImportError('as_numpy=True requires numpy')
+
+    prefix = array('Q', [0])
+    prefix_hash = 0
+    for value in values:
+        prefix_hash = (prefix_hash * _HASH_BASE + value) & _HASH_MASK
+        prefix.append(prefix_hash)
+
+    hashes = array('Q')
+    for size in range(n, max_n + 1):
+        power = pow(_HASH_BASE, size, 1 << 64)
+        seed = size * _HASH_SIZE_SEED
+        for idx in range(len(values) - size + 1):
+            if group_ids is None or group_ids[idx] == group_ids[idx + size - 1]:
+                hashes.append(_mix64((prefix[idx + size] - prefix[idx] * power + seed) & _HASH_MASK))
+    return hashes
+
+
+def text_n_gram_hashes(text: str,
+                       n: int = 2,
+                       max_n: Optional[int] = None,
+                       as_numpy: bool = False,
+                       ) -> Union[array, 'np.ndarray']:
+    """
+    64-bit hashes of all char n-grams, without building any substrings
+    same order as `text_n_grams`, and if max_n is given, all n-grams of each size from n to max_n in turn
+
+    :param text: to hash
+    :param n: how long is the n-gram
+    :param max_n: also include every longer n-gram up to this length
+    :param as_numpy: return a numpy uint64 array instead of `array('Q')`
+    """
+    if np is not None:
+        codepoints = np.frombuffer(text.encode('utf-32-le', 'surrogatepass'), dtype='<u4')
+        return _n_gram_hashes(codepoints, n, max_n, as_numpy=as_numpy)
+    return _n_gram_hashes(list(map(ord, text)), n, max_n, as_numpy=as_numpy)
+
+
+def word_n_gram_hashes(text: Union[str, TokenArray],
+                       n: int = 2,
+                       max_n: Optional[int] = None,
+                       split_sentences: bool = True,
+                       merge_apostrophe_word: bool = False,
+                       as_numpy: bool = False,
+                       ) -> Union[array, 'np.ndarray']:
+    """
+    64-bit hashes of word n-grams, without building any n-gram tuples
+    same n-grams as `word_n_grams` (but n can be 1), and if max_n is given, all n-grams of each size in turn
+    each word is hashed with blake2b, so hashes are the same across processes and runs
+
+    :param text: to split (or an already-tokenized TokenArray)
+    :param n: how long is the n-gram
+    :param max_n: also include every longer n-gram up to this length
+    :param split_sentences: don't allow n-grams to span sentences
+    :param merge_apostrophe_word: see tokenize function
+    :param as_numpy: return a numpy uint64 array instead of `array('Q')`
+    """
+    word_hashes = []
+    sentence_ids = None
+    if split_sentences:
+        sentence_ids = []
+        sentences = sentence_split_tokens(text, merge_apostrophe_word=merge_apostrophe_word)
+        for sentence_id, sentence_tokens in enumerate(sentences):
+            for token in sentence_tokens:
+                if token.category is TokenCategory.WORD:
+                    word_hashes.append(stable_hash(token.text))
+                    sentence_ids.append(sentence_id)
+
+    elif isinstance(text, TokenArray):
+        tokens = _merge_apostrophes_into_words(text) if merge_apostrophe_word else text
+        word_hashes = [stable_hash(token.text) for token in tokens if token.category is TokenCategory.WORD]
+
+    else:
+        word_hashes = list(map(stable_hash, unicode_tokenize(text,
+                                                            words_only=True,
+                                                            merge_apostrophe_word=merge_apostrophe_word)))
+
+    return _n_gram_hashes(word_hashes, n, max_n, sentence_ids, as_numpy=as_numpy)
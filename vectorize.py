@@ -0,0 +1,94 @@
+from collections import namedtuple
+from typing import Iterable
+from typing import Optional
+
+import numpy as np
+
+from regex_tokenizer import _preprocess
+from tokenizer import text_n_gram_hashes
+from tokenizer import word_n_gram_hashes
+
+# csr sparse matrix as plain numpy arrays, row i is `indices[indptr[i]:indptr[i + 1]]` and the matching data
+# use `scipy.sparse.csr_matrix((matrix.data, matrix.indices, matrix.indptr), shape=matrix.shape)` if needed
+SparseMatrix = namedtuple('SparseMatrix', ['data', 'indices', 'indptr', 'shape'])
+
+
+def hashing_vectorize(texts: Iterable[str],
+                      n_features: int = 1 << 20,
+                      analyzer: str = 'word',
+                      n: int = 1,
+                      max_n: Optional[int] = None,
+                      split_sentences: bool = True,
+                      nfkd: bool = False,
+                      casefold: bool = False,
+                      replace_ascii: bool = False,
+                      alternate_sign: bool = False,
+                      binary: bool = False,
+                      norm: Optional[str] = None,
+                      dtype: type = np.float32,
+                      ) -> SparseMatrix:
+    """
+    hash the n-grams of a whole batch of texts into a (texts, n_features) sparse matrix of n-gram counts
+    n-grams are never built as strings, see `word_n_gram_hashes` and `text_n_gram_hashes`
+    all the counting for the batch happens in a single `np.unique`, so there's no python dict per text
+
+    :param texts: batch of texts (rows of the matrix)
+    :param n_features: number of columns, hash collisions are likelier if this is small
+    :param analyzer: 'word' for word n-grams, 'char' for char n-grams
+    :param n: how long is the n-gram
+    :param max_n: also include every longer n-gram up to this length
+    :param split_sentences: don't allow word n-grams to span sentences
+    :param nfkd: see `regex_tokenizer.word_tokenize`
+    :param casefold: see `regex_tokenizer.word_tokenize`
+    :param replace_ascii: see `regex_tokenizer.word_tokenize`
+    :param alternate_sign: add or subtract each n-gram depending on a bit of its hash, so collisions tend to cancel
+    :param binary: 1 if the n-gram occurs instead of the count
+    :param norm: None, or 'l1' or 'l2' to normalize each row
+    :param dtype: of the data array
+    :return: SparseMatrix(data, indices, indptr, shape)
+    """
+    if analyzer not in {'word', 'char'}:
+        raise ValueError(f'unknown analyzer: {analyzer!r}')
+    if norm not in {None, 'l1', 'l2'}:
+        raise ValueError(f'unknown norm: {norm!r}')
+    assert 0 < n_features <= 1 << 31  # indices are int32, like scipy
+
+    hash_arrays = []
+    for text in texts:
+        if nfkd or casefold or replace_ascii:
+            text = _preprocess(text, nfkd=nfkd, casefold=casefold, replace_ascii=replace_ascii)
+        if analyzer == 'word':
+            hash_arrays.append(word_n_gram_hashes(text, n, max_n, split_sentences=split_sentences, as_numpy=True))
+        else:
+            hash_arrays.append(text_n_gram_hashes(text, n, max_n, as_numpy=True))
+
+    n_rows = len(hash_arrays)
+    lengths = np.fromiter(map(len, hash_arrays), dtype=np.int64, count=n_rows)
+    hashes = np.concatenate(hash_arrays) if hash_arrays else np.zeros(0, dtype=np.uint64)
+
+    # a single sort counts every (row, column) pair in the batch, and leaves them in csr order
+    columns = (hashes % np.uint64(n_features)).astype(np.int64)
+    keys = np.repeat(np.arange(n_rows, dtype=np.int64), lengths) * n_features + columns
+    unique_keys, inverse = np.unique(keys, return_inverse=True)
+    if alternate_sign:
+        signs = np.where(hashes >> np.uint64(63), -1.0, 1.0)
+        data = np.bincount(inverse.ravel(), weights=signs, minlength=len(unique_keys))
+        unique_keys, data = unique_keys[data != 0], data[data != 0]  # drop n-grams that cancelled out
+    else:
+        data = np.bincount(inverse.ravel(), minlength=len(unique_keys)).astype(np.float64)
+    if binary:
+        data = np.sign(data)
+
+    rows = unique_keys // n_features
+    indices = (unique_keys % n_features).astype(np.int32)
+    indptr = np.zeros(n_rows + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=n_rows), out=indptr[1:])
+
+    if norm is not None:
+        row_norms = np.bincount(rows, weights=np.abs(data) if norm == 'l1' else data * data, minlength=n_rows)
+        if norm == 'l2':
+            row_norms = np.sqrt(row_norms)
+        row_norms[row_norms == 0] = 1
+        data = data / row_norms[rows]
+
+    return SparseMatrix(data.astype(dtype, copy=False), indices, indptr, (n_rows, n_features))
@@ -0,0 +1,173 @@
+import json
+import sys
+from array import array
+from itertools import accumulate
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Union
+from zlib import crc32
+
+from tokenizer import unicode_tokenize
+
+# file layout: magic, header length (8 bytes, little-endian), json header, then the word lengths (in chars),
+# the word counts, and finally all the words as a single utf-8 string
+_MAGIC = b'TOKVOC01'
+
+
+class Vocabulary:
+    """
+    interns words and assigns them dense integer ids, so documents can be stored as `array('I')` instead of strings
+    the first `oov_buckets` ids are reserved for out-of-vocabulary words (after freezing or pruning),
+    which are spread over the buckets by a stable hash, so distinct unknown words don't all collide
+    """
+
+    def __init__(self, oov_buckets: int = 1):
+        """
+        :param oov_buckets: number of ids reserved for out-of-vocabulary words
+        """
+        assert oov_buckets >= 1
+        self.oov_buckets = oov_buckets
+        self.words: List[str] = ['<unk>'] if oov_buckets == 1 else [f'<unk:{idx}>' for idx in range(oov_buckets)]
+        self.word_ids: Dict[str, int] = dict()
+        self.counts = array('Q', [0] * oov_buckets)
+        self.frozen = False
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+    def __contains__(self, word: str) -> bool:
+        return word in self.word_ids
+
+    def freeze(self):
+        """
+        stop adding new words (and counting), new words are encoded as an oov bucket from now on
+        """
+        self.frozen = True
+
+    def oov_id(self, word: str) -> int:
+        if self.oov_buckets == 1:
+            return 0
+        return crc32(word.encode('utf8', 'surrogatepass')) % self.oov_buckets
+
+    def lookup(self, word: str) -> int:
+        """
+        id of a word without adding or counting it
+        """
+        word_id = self.word_ids.get(word)
+        return self.oov_id(word) if word_id is None else word_id
+
+    def add(self, word: str, count: int = 1) -> int:
+        word_id = self.word_ids.get(word)
+        if word_id is None:
+            if self.frozen:
+                return self.oov_id(word)
+            word = sys.intern(word)
+            word_id = self.word_ids[word] = len(self.words)
+            self.words.append(word)
+            self.counts.append(0)
+        if not self.frozen:
+            self.counts[word_id] += count
+        return word_id
+
+    def encode(self, text: Union[str, Iterable[str]], words_only: bool = True) -> array:
+        """
+        ids of the tokens of a text (using `unicode_tokenize`), or of already-tokenized strings
+        (e.g. from `regex_tokenizer.word_tokenize`), adding and counting new words unless frozen
+
+        :param text: string to be tokenized, or an iterable of token strings
+        :param words_only: whether or not to encode punctuation/symbols/unprintable/whitespace (for a string)
+        :return: array('I') of ids
+        """
+        tokens = unicode_tokenize(text, words_only=words_only, engine='run') if isinstance(text, str) else text
+        if self.frozen:
+            get = self.word_ids.get
+            ids = array('I')
+            for token in tokens:
+                word_id = get(token)
+                ids.append(self.oov_id(token) if word_id is None else word_id)
+            return ids
+        return array('I', map(self.add, tokens))
+
+    def decode(self, ids: Iterable[int]) -> List[str]:
+        """
+        words of the ids, oov buckets decode to '<unk>' (or '<unk:N>' if there are several buckets)
+        """
+        return list(map(self.words.__getitem__, ids))
+
+    def prune(self, min_count: int = 1, max_size: Optional[int] = None) -> array:
+        """
+        drop rare words and renumber the remaining ones (in order of decreasing count)
+        returns an array('I') mapping each old id to its new id, so already-encoded documents can be remapped
+        with `array('I', map(remap.__getitem__, ids))`; dropped words are mapped to their oov bucket
+
+        :param min_count: drop words that were counted less often than this
+        :param max_size: keep at most this many ids (including the oov buckets)
+        """
+        kept = [word_id for word_id in range(self.oov_buckets, len(self.words)) if self.counts[word_id] >= min_count]
+        kept.sort(key=lambda word_id: self.counts[word_id], reverse=True)
+        if max_size is not None:
+            kept = kept[:max(0, max_size - self.oov_buckets)]
+
+        remap = array('I', range(self.oov_buckets))
+        remap.extend(self.oov_id(word) for word in self.words[self.oov_buckets:])
+        words = self.words[:self.oov_buckets]
+        counts = self.counts[:self.oov_buckets]
+        for word_id in kept:
+            remap[word_id] = len(words)
+            words.append(self.words[word_id])
+            counts.append(self.counts[word_id])
+
+        # dropped words are counted in their oov bucket
+        kept_ids = set(kept)
+        for word_id in range(self.oov_buckets, len(self.words)):
+            if word_id not in kept_ids:
+                counts[remap[word_id]] += self.counts[word_id]
+
+        self.words = words
+        self.counts = counts
+        self.word_ids = {word: word_id for word_id, word in enumerate(words) if word_id >= self.oov_buckets}
+        return remap
+
+    def save(self, path: str):
+        words = self.words[self.oov_buckets:]
+        header = json.dumps({'oov_buckets': self.oov_buckets, 'frozen': self.frozen, 'size': len(words)})
+        lengths = array('I', map(len, words))
+        counts = self.counts
+        if sys.byteorder != 'little':
+            lengths.byteswap()
+            counts = array('Q', counts)
+            counts.byteswap()
+
+        with open(path, 'wb') as f:
+            f.write(_MAGIC)
+            f.write(len(header).to_bytes(8, 'little'))
+            f.write(header.encode('utf8'))
+            f.write(lengths.tobytes())
+            f.write(counts.tobytes())
+            f.write(''.join(words).encode('utf8', 'surrogatepass'))
+
+    @classmethod
+    def load(cls, path: str) -> 'Vocabulary':
+        with open(path, 'rb') as f:
+            if f.read(len(_MAGIC)) != _MAGIC:
+                raise ValueError(f'not a vocabulary file: {path!r}')
+            header = json.loads(f.read(int.from_bytes(f.read(8), 'little')).decode('utf8'))
+            lengths = array('I')
+            lengths.frombytes(f.read(4 * header['size']))
+            counts = array('Q')
+            counts.frombytes(f.read(8 * (header['oov_buckets'] + header['size'])))
+            text = f.read().decode('utf8', 'surrogatepass')
+        if sys.byteorder != 'little':
+            lengths.byteswap()
+            counts.byteswap()
+
+        vocabulary = cls(oov_buckets=header['oov_buckets'])
+        offsets = list(accumulate(lengths, initial=0))
+        words = [sys.intern(text[start:end]) for start, end in zip(offsets, offsets[1:])]
+        vocabulary.words.extend(words)
+        vocabulary.word_ids = {word: word_id for word_id, word in enumerate(words, start=header['oov_buckets'])}
+        vocabulary.counts = counts
+        vocabulary.frozen = header['frozen']
+        return vocabulary